@@ -4,16 +4,21 @@
 # Includes PDF attachment: Benefits.pdf
 # UTF-8 safe for emojis and special characters
 
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from email.header import Header
-from google.oauth2.service_account import Credentials
-import gspread
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import os
+import sys
+from attachments import get_attachment
+from emailtemplate import SUMMARY_FIELDS, compile_summary, summary_fields
+from rowschema import MISSING, FieldResolver
+from ratelimit import SharedTokenBucket, TokenBucket
+from leadindex import column_letter, parse_sent
+from watermark import Watermark
+# worksheet handle, header cache and the (lazy) gspread client are shared with googlesheet.py
+from googlesheet import WORKSHEET_NAME, get_sheet, get_header_map, get_headers, invalidate_sheet_cache, handle_api_error, normalise_header
 
 # -------------------------------------------------
 # GMAIL SMTP CONFIG
@@ -26,314 +31,340 @@ SMTP_PASSWORD = "boch kenq tanl jxhr"        # 🔴 CHANGE
 
 SENDER_NAME = "Erica – Income Protection Advisor"
 
-# -------------------------------------------------
-# GOOGLE SHEETS CONFIG
-# -------------------------------------------------
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-CREDS = Credentials.from_service_account_file(
-    "ServiceAccount.json",
-    scopes=SCOPE
-)
+SMTP_POOL_SIZE = int(os.environ.get("SGSH_SMTP_POOL_SIZE", 4))
+SMTP_MAX_MESSAGES = int(os.environ.get("SGSH_SMTP_MAX_MESSAGES", 100))  # per connection
+
+# Gmail allows ~500 recipients per rolling day on a consumer account. Every
+# send (chat path and poller, all processes) draws on one shared budget that
+# refills at EMAIL_DAILY_LIMIT per day and holds at most EMAIL_DAILY_BURST,
+# so no 24 hours ever see more than EMAIL_DAILY_LIMIT + EMAIL_DAILY_BURST.
+EMAIL_DAILY_LIMIT = float(os.environ.get("SGSH_EMAIL_DAILY_LIMIT", 450))
+EMAIL_DAILY_BURST = int(os.environ.get("SGSH_EMAIL_DAILY_BURST", 50))
+EMAIL_QUOTA_PATH = os.environ.get("SGSH_EMAIL_QUOTA_PATH", "email_quota.db")
+
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+def get_smtp_pool():
+    """Process-wide SMTP connection pool for the Gmail account above."""
+    global _smtp_pool
+    with _smtp_pool_lock:
+        if _smtp_pool is None:
+            # import locally: smtplib is only needed once we actually send
+            from smtppool import SMTPPool
+            _smtp_pool = SMTPPool(
+                SMTP_SERVER, SMTP_PORT,
+                username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                size=SMTP_POOL_SIZE, max_messages=SMTP_MAX_MESSAGES,
+            )
+        return _smtp_pool
 
-client = gspread.authorize(CREDS)
+class DailyLimitReached(Exception):
+    """The shared daily email budget is used up; nothing was sent."""
 
-SPREADSHEET_NAME = "ChatBotData"
-WORKSHEET_NAME = "Campaign1"
+_daily_budget = None
 
-# -------------------------------------------------
-# HELPER: Safe value getter (improved)
-# -------------------------------------------------
-def v(row, key):
-    """Robust getter: try multiple variants and do case-insensitive matching."""
-    if not row:
-        return "—"
-    if key in row and row.get(key):
-        return row.get(key)
-    def norm(s): return str(s).lower().replace(" ", "").replace("_", "")
-    target = norm(key)
-    for existing in row.keys():
-        if norm(existing) == target:
-            val = row.get(existing)
-            return val if val else "—"
-    alt_map = {
-        "LifeStage": ["Life Stage", "life_stage"],
-        "ProtectionLevel": ["Protection Level", "protection_level"],
-        "MonthlyBudget": ["Monthly Budget", "monthly_budget"],
-        "Whatsapp": ["Whatsapp", "WhatsApp", "wa_link", "WhatsApp Link"],
-        "Name": ["name"],
-        "Income": ["income"],
-        "Phone": ["phone"],
-        "Dependents": ["dependents"],
-        "Email": ["email", "Email Address"],
-        "Age": ["age"]
-    }
-    for k, alts in alt_map.items():
-        if norm(key) == norm(k):
-            for a in alts:
-                for existing in row.keys():
-                    if norm(existing) == norm(a):
-                        val = row.get(existing)
-                        return val if val else "—"
-    return "—"
+def get_daily_budget():
+    """The SharedTokenBucket every send_email draws one token from."""
+    global _daily_budget
+    with _smtp_pool_lock:
+        if _daily_budget is None:
+            _daily_budget = SharedTokenBucket(
+                "email.daily", EMAIL_DAILY_LIMIT / 86400, EMAIL_DAILY_BURST, EMAIL_QUOTA_PATH
+            )
+        return _daily_budget
 
 # -------------------------------------------------
-# Helper for modern table rows
+# BUILD EMAIL HTML (Modern UI, precompiled in emailtemplate.py)
 # -------------------------------------------------
-def row_item(label, value):
-    return f"""
-    <tr>
-        <td style="
-            padding:12px 10px;
-            color:#6b7280;
-            border-bottom:1px solid #e5e7eb;
-            width:45%;
-        ">
-            {label}
-        </td>
-        <td style="
-            padding:12px 10px;
-            font-weight:600;
-            border-bottom:1px solid #e5e7eb;
-            color:#111827;
-        ">
-            {value}
-        </td>
-    </tr>
-    """
+SUMMARY_TEMPLATE = compile_summary(SENDER_NAME)
 
-# -------------------------------------------------
-# BUILD EMAIL HTML (Modern UI)
-# -------------------------------------------------
 def build_email_html(row):
-    # Fixed WhatsApp number
-    whatsapp_number = "+60168357258"
-    whatsapp_link = f"https://wa.me/{whatsapp_number.lstrip('+')}"
-
-    return f"""
-<!DOCTYPE html>
-<html>
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-</head>
-
-<body style="
-    margin:0;
-    padding:0;
-    background:#f4f6fb;
-    font-family:'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
-    color:#1f2937;
-">
-
-<table width="100%" cellpadding="0" cellspacing="0">
-<tr>
-<td align="center" style="padding:40px 15px;">
-
-    <!-- Card -->
-    <table width="100%" style="
-        max-width:600px;
-        background:#ffffff;
-        border-radius:16px;
-        box-shadow:0 10px 30px rgba(0,0,0,0.08);
-        overflow:hidden;
-    ">
-
-        <!-- Header -->
-        <tr>
-        <td style="
-            background:linear-gradient(135deg,#2563eb,#1e40af);
-            padding:28px 30px;
-            color:#ffffff;
-        ">
-            <h1 style="
-                margin:0;
-                font-size:22px;
-                font-weight:600;
-            ">
-                Your Income Protection Summary
-            </h1>
-            <p style="
-                margin:6px 0 0;
-                opacity:0.9;
-                font-size:14px;
-            ">
-                Satu Gaji Satu Harapan
-            </p>
-        </td>
-        </tr>
-
-        <!-- Body -->
-        <tr>
-        <td style="padding:30px;">
-
-            <p style="font-size:16px;margin-top:0;">
-                Hi <b>{v(row,'Name')}</b> 👋
-            </p>
-
-            <p style="color:#4b5563;">
-                Thank you for completing your personalised income protection review.
-                Here’s a clear summary prepared just for you:
-            </p>
-
-            <!-- Info Table -->
-            <table width="100%" cellpadding="0" cellspacing="0" style="
-                margin:25px 0;
-                border-collapse:collapse;
-                font-size:14px;
-            ">
-
-                {row_item("Age", v(row,'Age'))}
-                {row_item("Life Stage", v(row,'LifeStage'))}
-                {row_item("Dependents", v(row,'Dependents'))}
-                {row_item("Protection Level", v(row,'ProtectionLevel'))}
-                {row_item("Monthly Budget", v(row,'MonthlyBudget'))}
-                {row_item("Annual Income", v(row,'Income'))}
-                {row_item("Phone", v(row,'Phone'))}
-
-            </table>
-
-            <!-- CTA -->
-            <div style="
-                background:#f1f5f9;
-                padding:18px;
-                border-radius:12px;
-                text-align:center;
-                margin-top:30px;
-            ">
-                <p style="margin:0 0 10px;font-size:15px;">
-                    Our licensed advisor will reach out to you shortly.
-                </p>
-
-                <a href="{whatsapp_link}" style="
-                    display:inline-block;
-                    padding:12px 22px;
-                    background:#22c55e;
-                    color:#ffffff;
-                    text-decoration:none;
-                    font-weight:600;
-                    border-radius:999px;
-                    font-size:14px;
-                ">
-                    💬 Chat on WhatsApp
-                </a>
-            </div>
-
-        </td>
-        </tr>
-
-        <!-- Footer -->
-        <tr>
-        <td style="
-            padding:22px 30px;
-            background:#f9fafb;
-            border-top:1px solid #e5e7eb;
-            font-size:12px;
-            color:#6b7280;
-        ">
-            <p style="margin:0 0 10px;">
-                Subject to policy terms and final approval by authorised representatives.
-            </p>
-
-            <p style="margin:0;">
-                Warm regards,<br>
-                <b>{SENDER_NAME}</b>
-            </p>
-        </td>
-        </tr>
-
-    </table>
-
-</td>
-</tr>
-</table>
-
-</body>
-</html>
-"""
+    return SUMMARY_TEMPLATE.render(summary_fields(row))
+
+def build_email_body(row):
+    """The same HTML as UTF-8 bytes, ready to be streamed by send_email."""
+    return SUMMARY_TEMPLATE.render_bytes(summary_fields(row))
 
 # -------------------------------------------------
 # SEND EMAIL (UTF-8 safe, with PDF attachment)
 # -------------------------------------------------
 def send_email(to_email, subject, html_content, attachment_path="Benefits.pdf"):
-    msg = MIMEMultipart("mixed")  # use mixed to allow attachments
-    msg["From"] = f"{SENDER_NAME} <{SMTP_USERNAME}>"
-    msg["To"] = to_email
-    msg["Subject"] = Header(subject, 'utf-8')  # UTF-8 subject
-
-    # HTML body in UTF-8
-    html_part = MIMEText(html_content, "html", "utf-8")
-    msg.attach(html_part)
-
-    # Attach PDF if exists
-    if attachment_path and os.path.isfile(attachment_path):
-        with open(attachment_path, "rb") as f:
-            part = MIMEBase("application", "pdf")
-            part.set_payload(f.read())
-            encoders.encode_base64(part)
-            part.add_header(
-                "Content-Disposition",
-                f'attachment; filename="{os.path.basename(attachment_path)}"',
-            )
-            msg.attach(part)
-    else:
+    from smtplib import SMTPServerDisconnected
+    from smtppool import SMTPReplyLost
+    from mimestream import iter_email_chunks   # email.* imported on first send
+    if get_daily_budget().try_acquire():
+        # the row keeps an empty Email_sent, so the poller sends it once budget is back
+        raise DailyLimitReached(f"daily email limit reached, not sending to {to_email}")
+    # Attach PDF if exists (encoded once per process, see attachments.py)
+    attachment = get_attachment(attachment_path) if attachment_path else None
+    if attachment is None:
         print(f"[Warning] Attachment not found: {attachment_path}")
 
-    # Send email
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
+    # Stream the message in fixed-size chunks over a pooled, already-authenticated
+    # connection instead of building and flattening the whole MIME tree in memory
+    def chunks():
+        return iter_email_chunks(SENDER_NAME, SMTP_USERNAME, to_email, subject,
+                                 html_content, attachment)
+
+    pool = get_smtp_pool()
+    try:
+        try:
+            pool.send_stream(SMTP_USERNAME, [to_email], chunks())
+        except SMTPServerDisconnected as e:
+            # Dropped (or 421) before the message was complete, so the server
+            # cannot have it; the generator is spent, so rebuild it and retry
+            # once on a fresh connection
+            print(f"[Email] Connection lost sending to {to_email} ({e}), retrying once")
+            pool.send_stream(SMTP_USERNAME, [to_email], chunks())
+    except SMTPReplyLost as e:
+        # The server may well have accepted it; sending again could deliver
+        # a duplicate, so count it as sent (Email_sent is written as usual)
+        print(f"[Email] {e} for {to_email}; assuming it was delivered, not resending")
 
     print(f"[Email] Sent → {to_email} (with attachment: {os.path.basename(attachment_path)})")
 
 # -------------------------------------------------
 # UPDATE EmailSent COLUMN
 # -------------------------------------------------
+EMAIL_SENT_HEADERS = [normalise_header(h) for h in
+                      ["EmailSent", "Email_sent", "Email Sent", "EmailSentTimestamp", "Email_sent_timestamp"]]
+
+def email_sent_column(sheet):
+    """Column number of the Email_sent header, adding the header if it is missing."""
+    header_map = get_header_map(sheet)
+    cols = [header_map[h] for h in EMAIL_SENT_HEADERS if h in header_map]
+    if cols:
+        return min(cols)
+    email_sent_col = max(header_map.values(), default=0) + 1
+    sheet.update_cell(1, email_sent_col, "Email_sent")
+    invalidate_sheet_cache()
+    return email_sent_col
+
+def sent_timestamp():
+    return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
 def update_email_sent(sheet, row_index):
-    timestamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    possible_headers = ["EmailSent", "Email_sent", "Email Sent", "EmailSentTimestamp", "Email_sent_timestamp"]
-    headers = sheet.row_values(1)
-    email_sent_col = None
-    def norm(s): return str(s).lower().replace(" ", "").replace("_", "")
-    for i, h in enumerate(headers, start=1):
-        if norm(h) in [norm(x) for x in possible_headers]:
-            email_sent_col = i
-            break
-    if not email_sent_col:
-        email_sent_col = len(headers) + 1
-        sheet.update_cell(1, email_sent_col, "Email_sent")
-    sheet.update_cell(row_index, email_sent_col, timestamp)
+    try:
+        sheet.update_cell(row_index, email_sent_column(sheet), sent_timestamp())
+    except Exception as e:
+        handle_api_error(e)
+        raise
+
+def write_email_sent(sheet, sent):
+    """Write all collected (row_index, timestamp) pairs in one batch_update."""
+    if not sent:
+        return
+    try:
+        letter = column_letter(email_sent_column(sheet))
+        sheet.batch_update(
+            [{"range": f"{letter}{row_index}", "values": [[timestamp]]}
+             for row_index, timestamp in sent],
+            value_input_option="RAW",
+        )
+    except Exception as e:
+        handle_api_error(e)
+        raise
+    print(f"[Email] Marked {len(sent)} row(s) as sent")
 
 # -------------------------------------------------
 # MAIN PROCESS
 # -------------------------------------------------
-def process_pending_emails():
-    sheet = client.open(SPREADSHEET_NAME).worksheet(WORKSHEET_NAME)
+SUBJECT = "Your Personalised Income Protection Summary"
+
+# Gmail also throttles bursts: a batch is paced at EMAIL_RATE on top of the
+# daily budget above, and a run sends no more than the budget has left.
+EMAIL_WORKERS = int(os.environ.get("SGSH_EMAIL_WORKERS", SMTP_POOL_SIZE))
+EMAIL_RATE = float(os.environ.get("SGSH_EMAIL_RATE", 0.5))       # emails per second
+EMAIL_BURST = int(os.environ.get("SGSH_EMAIL_BURST", 5))
+EMAIL_BATCH_LIMIT = int(os.environ.get("SGSH_EMAIL_BATCH_LIMIT", 500))
+PROGRESS_INTERVAL = 10  # seconds
+# Rows saved less than this long ago are left alone: the chat path
+# (googlesheet.write_session) may still be sending their summary email
+EMAIL_GRACE = float(os.environ.get("SGSH_EMAIL_GRACE", 15 * 60))  # seconds
+
+def blank(value):
+    value = str(value).strip()
+    return "" if value == MISSING else value
+
+# Summary fields first, so a row's vector can be rendered by SUMMARY_TEMPLATE as-is
+row_fields = FieldResolver(SUMMARY_FIELDS + ("Email", "EmailSent", "Timestamp"))
+EMAIL_FIELD = len(SUMMARY_FIELDS)
+EMAIL_SENT_FIELD = EMAIL_FIELD + 1
+TIMESTAMP_FIELD = EMAIL_FIELD + 2
+
+def pending_rows(vectors, start=2):
+    """(row_index, email, fields) for rows with an email address and no Email_sent value."""
+    for idx, fields in enumerate(vectors, start=start):  # Row 2 = first data row
+        email = blank(fields[EMAIL_FIELD])
+        if email and not blank(fields[EMAIL_SENT_FIELD]):
+            yield idx, email, fields
+
+def recently_saved(fields, cutoff):
+    """True if the row's Timestamp (same format as Email_sent) is after `cutoff`."""
+    saved = parse_sent(blank(fields[TIMESTAMP_FIELD]))
+    return saved is not None and saved > cutoff
+
+def budget_left():
+    """Emails the shared daily budget allows right now."""
+    return int(get_daily_budget().level())
+
+def send_pending(sheet, jobs, workers=EMAIL_WORKERS, rate=EMAIL_RATE, burst=EMAIL_BURST):
+    """
+    Send `jobs` ((row_index, email, fields) tuples from pending_rows) with `workers` threads sharing
+    the SMTP pool, throttled to `rate` emails/second (bursts of `burst`).
+    Email_sent timestamps are written back in one batch_update at the end,
+    including when the run is interrupted.
+    """
+    total = len(jobs)
+    if not total:
+        return {"sent": 0, "failed": 0}
+    print(f"[Email] {total} pending email(s), {workers} worker(s), {rate:g}/s")
+
+    bucket = TokenBucket(rate, burst)
+    sent = []
+    failed = 0
+    started = last_report = time.monotonic()
+
+    def deliver(job):
+        idx, email, fields = job
+        bucket.acquire()
+        send_email(email, SUBJECT, SUMMARY_TEMPLATE.render_bytes(fields))  # PDF included by default
+        return idx, sent_timestamp()
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email")
+    futures = {pool.submit(deliver, job): job for job in jobs}
+    collected = set()
+    try:
+        for future in as_completed(futures):
+            collected.add(future)
+            try:
+                sent.append(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"[Error] Email failed → {futures[future][1]}: {e}")
+
+            now = time.monotonic()
+            done = len(sent) + failed
+            if now - last_report >= PROGRESS_INTERVAL or done == total:
+                last_report = now
+                elapsed = now - started
+                throughput = done / elapsed if elapsed else 0.0
+                eta = (total - done) / throughput if throughput else 0.0
+                print(f"[Email] {done}/{total} done ({failed} failed) "
+                      f"{throughput:.2f} emails/s, ETA {eta:.0f}s")
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        # On interruption, sends already in flight finish during shutdown;
+        # record them too or the next run would email those rows again
+        for future in futures:
+            if future in collected or future.cancelled():
+                continue
+            if future.done() and future.exception() is None:
+                sent.append(future.result())
+        write_email_sent(sheet, sent)
+
+    return {"sent": len(sent), "failed": failed}
+
+def process_pending_emails(limit=EMAIL_BATCH_LIMIT, grace=EMAIL_GRACE, **options):
+    """
+    Reconcile: scan the whole sheet and send every pending email (at most
+    `limit`). Catches rows the incremental poller has already passed, e.g.
+    sends that failed or rows edited by hand. Rows saved within `grace`
+    seconds are skipped.
+    """
+    sheet = get_sheet()
     rows = sheet.get_all_records()
+    cutoff = time.time() - grace
+    settled = (job for job in pending_rows(map(row_fields, rows))
+               if not recently_saved(job[2], cutoff))
+    jobs = list(itertools.islice(settled, min(limit, budget_left())))
+    if not jobs:
+        print("[Email] No pending emails, or no daily email budget left")
+    return send_pending(sheet, jobs, **options)
 
-    for idx, row in enumerate(rows, start=2):  # Row 2 = first data row
-        email = v(row, "Email").strip()
-        email_sent = v(row, "EmailSent").strip()
-
-        if not email or email_sent:
-            continue
-
+# -------------------------------------------------
+# INCREMENTAL POLLING
+# -------------------------------------------------
+POLL_INTERVAL = float(os.environ.get("SGSH_EMAIL_POLL_INTERVAL", 60))  # seconds
+
+_watermark = None
+
+def get_watermark():
+    """Last Campaign1 row the poller has fully processed (persisted)."""
+    global _watermark
+    if _watermark is None:
+        _watermark = Watermark(f"{WORKSHEET_NAME}.email_scanned_through", default=1)
+    return _watermark
+
+def read_rows_from(sheet, start):
+    """Field vectors for rows `start`.., reading only that range."""
+    headers = get_headers(sheet)
+    if not headers:
+        return []
+    values = sheet.get(f"A{start}:{column_letter(len(headers))}")
+    return [row_fields.resolve_values(headers, cells) for cells in values]
+
+def poll_pending_emails(limit=EMAIL_BATCH_LIMIT, grace=EMAIL_GRACE, **options):
+    """
+    One poll: read the rows appended since the watermark, send their pending
+    emails and advance the watermark. Each poll costs the same regardless of
+    sheet size; rows behind the watermark are only revisited by a reconcile.
+    The watermark stops before the first pending row saved within `grace`
+    seconds, so it is looked at again once the chat path has had its turn.
+    """
+    mark = get_watermark()
+    sheet = get_sheet()
+    start = mark.get() + 1
+    try:
+        rows = read_rows_from(sheet, start)
+    except Exception as e:
+        handle_api_error(e)
+        raise
+    if not rows:
+        return {"sent": 0, "failed": 0}
+
+    cutoff = time.time() - grace
+    jobs = []
+    scanned_through = start + len(rows) - 1
+    for job in pending_rows(rows, start=start):
+        if recently_saved(job[2], cutoff):
+            scanned_through = job[0] - 1
+            break
+        jobs.append(job)
+    limit = min(limit, budget_left())
+    if len(jobs) > limit:
+        scanned_through = jobs[limit][0] - 1    # resume at the first job not attempted
+        jobs = jobs[:limit]
+        if not limit:
+            print(f"[Email] Daily email limit reached, row {scanned_through + 1} onwards wait")
+
+    result = send_pending(sheet, jobs, **options)
+    mark.set(scanned_through)
+    if result["failed"]:
+        print(f"[Email] {result['failed']} failed send(s) will be retried on the next reconcile")
+    return result
+
+def run_email_poller(interval=POLL_INTERVAL, **options):
+    """Poll for new pending emails every `interval` seconds until interrupted."""
+    print(f"[Email] Polling from row {get_watermark().get() + 1} every {interval:g}s")
+    while True:
         try:
-            html = build_email_html(row)
-            subject = "Your Personalised Income Protection Summary"
-
-            send_email(email, subject, html)  # PDF included by default
-            update_email_sent(sheet, idx)
-
+            poll_pending_emails(**options)
         except Exception as e:
-            print(f"[Error] Email failed → {email}: {e}")
+            print(f"[Error] Email poll failed: {e}")
+        time.sleep(interval)
 
 # -------------------------------------------------
 # RUN
 # -------------------------------------------------
 if __name__ == "__main__":
-    process_pending_emails()
+    # python Emailservice.py              -> long-running incremental poller
+    # python Emailservice.py --once       -> a single incremental poll
+    # python Emailservice.py --reconcile  -> full rescan of the sheet
+    if "--reconcile" in sys.argv[1:]:
+        process_pending_emails()
+    elif "--once" in sys.argv[1:]:
+        poll_pending_emails()
+    else:
+        run_email_poller()
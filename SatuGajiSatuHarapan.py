@@ -2,54 +2,62 @@
 # Web server for the "Protecting My Income" chatbot using Flask
 # Integrated with Google Sheets (Campaign1) to save session data automatically
 
-from flask import Flask, request, jsonify, render_template, session
-from datetime import datetime
-import re
-from googlesheet import save_session  
+from flask import Blueprint, Flask, request, jsonify, render_template, session
+import os
+import secrets
+from conversation import STEPS, UNKNOWN_STATE_REPLY
+import chatstate
+import validators
+from statestore import create_state_store
+from replaycache import ReplayCache, message_id
+import spool
+import warmup
+from sheetsquota import get_scheduler
 
 class SGSHChatbot:
+    __slots__ = ("state", "user_data")
+
     def __init__(self):
         self.state = "start"
         self.user_data = {}
 
     # -------------------------
-    # Helper: calculate age
+    # Persistence (see chatstate.py for the encoding)
     # -------------------------
-    def calculate_age(self, dob_str):
-        try:
-            dob = datetime.strptime(dob_str, "%d/%m/%Y")
-            today = datetime.today()
-            age = today.year - dob.year - (
-                (today.month, today.day) < (dob.month, dob.day)
-            )
-            return age
-        except ValueError:
-            return None
+    @classmethod
+    def from_state(cls, encoded):
+        chatbot = cls()
+        decoded = chatstate.unpack(encoded) if encoded is not None else None
+        if decoded is not None:
+            chatbot.state, chatbot.user_data = decoded
+        return chatbot
+
+    def to_state(self, text=False):
+        """The packed tuple, or with `text` (for SQLite / Redis) the delimited line."""
+        if text:
+            encoded = chatstate.pack_text(self.state, self.user_data)
+            if encoded is not None:
+                return encoded
+        return chatstate.pack(self.state, self.user_data)
 
     # -------------------------
-    # Helper: parse income
+    # Helpers (implemented in validators.py)
     # -------------------------
+    def calculate_age(self, dob_str):
+        return validators.calculate_age(dob_str)
+
     def parse_income(self, message):
-        cleaned = re.sub(r"[^\d]", "", message)
-        return int(cleaned) if cleaned.isdigit() else None
+        return validators.parse_income(message)
 
-    # -------------------------
-    # Helper: validate email
-    # -------------------------
     def validate_email(self, email):
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return validators.validate_email(email)
 
-    # -------------------------
-    # Helper: validate Malaysian phone
-    # -------------------------
     def validate_malaysian_phone(self, phone):
-        phone = re.sub(r"[^\d]", "", phone)  # remove non-digits
-        # Valid formats: starts with 60 (country code) or 01
-        return bool(re.match(r"^(60\d{8,9}|01\d{7,8})$", phone))
+        return validators.validate_malaysian_phone(phone)
 
     # -------------------------
     # Main chatbot logic
+    # Steps are defined in conversation.FLOW
     # -------------------------
     def process(self, message):
         message = message.strip()
@@ -59,324 +67,130 @@ class SGSHChatbot:
             self.__init__()
             return "Returning to main menu. Please choose an option."
 
-        # --- Step 1: Greet and ask name ---
-        if self.state == "start":
-            self.state = "ask_name"
-            return "Hello! I'm Erica, your super agent that will guide you today 😊\nMay I know your name?"
-
-        # --- Step 2: Ask for name ---
-        if self.state == "ask_name":
-            if not message:
-                return "Please enter your name to continue."
-            self.user_data["name"] = message
-            self.state = "ask_dob"
-            return (
-                f"Hello, {message}! Nice to meet you! Let’s get to know you better. 😊\n"
-                f"May I know your Date of Birth?\n(Format: DD / MM / YYYY )"
-            )
-
-        # --- Step 3: Ask for DOB ---
-        if self.state == "ask_dob":
-            if not message:
-                return "You did not enter anything.\nPlease enter your Date of Birth (DD/MM/YYYY)."
-            
-            age = self.calculate_age(message)
-            
-            if age is None:
-                return (
-            "Invalid date format, please try again ❌\n"
-            "Please enter your Date of Birth as DD/MM/YYYY\n"
-            "Example: 25/12/1990"
-        )
-            if age < 18:
-                return (
-                    f"You are {age} years old.\n"
-                    "Sorry, this service is only available for users aged 18 and above."
-                )
-            
-            if age >= 80:
-                return (
-            f"You are {age} years old.\n"
-            "Sorry, this service is only available for users below 80 years old."
-        )
-            self.user_data["dob"] = message
-            self.user_data["age"] = age
-            self.state = "ask_life_stage"
-            return (
-                f"Great! You are {age} years old.\n"
-                "It is the perfect age to start building a strong foundation for your future savings.\n"
-                "May I know what is your current life stage?\n"
-                "1. Just married\n"
-                "2. I have a young child / Children\n"
-                "3. Nearing Retirement \n"
-                "4. Single and independent"
-                  )
-
-
-        # --- Step 4: Ask for life stage ---
-        if self.state == "ask_life_stage":
-            options = {
-                "1": "Just married",
-                "2": "I have a young child / Children",
-                "3": "Nearing Retirement",
-                "4": "Single and independent"
-            }
-            if message not in options:
-                return (
-                    "Please choose a valid option: 1, 2, 3, or 4.\n"
-                    f"What is your current life stage?\n"
-                    f"1. Just married\n"
-                    f"2. I have a young child / Children\n"
-                    f"3. Nearing Retirement\n"
-                    f"4. Single and independent"
-                )
-            self.user_data["life_stage"] = options[message]
-            self.state = "ask_dependents"
-            return (
-                f"Thank you! Your life stage is: {options[message]}\n"
-                f"How many dependents do you have?\n"
-                f"1. 1 only\n"
-                f"2. 1-2 person\n"
-                f"3. 3-4 person\n"
-                f"4. More than 4 person"
-            )
-
-        # --- Step 5: Ask for dependents ---
-        if self.state == "ask_dependents":
-            options = {
-                "1": "1 only",
-                "2": "1-2 person",
-                "3": "3-4 person",
-                "4": "More than 4 person"
-            }
-            if message not in options:
-                return (
-                    "Please choose a valid option: 1, 2, 3, or 4.\n"
-                    f"How many dependents do you have?\n"
-                    f"1. 1 only\n"
-                    f"2. 1-2 person\n"
-                    f"3. 3-4 person\n"
-                    f"4. More than 4 person"
-                )
-            self.user_data["dependents"] = options[message]
-            self.state = "ask_protection_level"
-            return (
-                f"Thank you! You have {options[message]} dependents.\n"
-                f"What is your current level of protection?\n"
-                f"1. No coverage at all\n"
-                f"2. Basic employee coverage\n"
-                f"3. Some personal coverage\n"
-                f"4. Comprehensive coverage"
-            )
-
-        # --- Step 6: Ask for protection level ---
-        if self.state == "ask_protection_level":
-            options = {
-                "1": "No coverage at all",
-                "2": "Basic employee coverage",
-                "3": "Some personal coverage",
-                "4": "Comprehensive coverage"
-            }
-            if message not in options:
-                return (
-                    "Please choose a valid option: 1, 2, 3, or 4.\n"
-                    f"What is your current level of protection?\n"
-                    f"1. No coverage at all\n"
-                    f"2. Basic employee coverage\n"
-                    f"3. Some personal coverage\n"
-                    f"4. Comprehensive coverage"
-                )
-            self.user_data["protection_level"] = options[message]
-            self.state = "ask_budget"
-            return (
-                f"Thank you! Your protection level is: {options[message]}\n"
-                f"May I know your budget for monthly premium?\n"
-                f"1. Less than RM200\n"
-                f"2. RM201 - RM500\n"
-                f"3. RM501 - RM1000\n"
-                f"4. More than RM1000"
-            )
-
-        # --- Step 7: Ask for budget ---
-        if self.state == "ask_budget":
-            options = {
-                "1": "Less than RM200",
-                "2": "RM201 - RM500",
-                "3": "RM501 - RM1000",
-                "4": "More than RM1000"
-            }
-            if message not in options:
-                return (
-                    "Please choose a valid option: 1, 2, 3, or 4.\n"
-                    f"May I know your budget for monthly premium?\n"
-                    f"1. Less than RM200\n"
-                    f"2. RM201 - RM500\n"
-                    f"3. RM501 - RM1000\n"
-                    f"4. More than RM1000"
-                )
-            self.user_data["budget"] = options[message]
-            self.state = "ask_phone"  # NEW STEP
-            return (
-                f"Thank you! Your monthly budget is: {options[message]}\n"
-                "Please enter your phone number so we can provide you with updates from time to time on suitable offers and packages."
-            )
-
-        # --- Step 7b: Ask for phone number ---
-        if self.state == "ask_phone":
-            if not self.validate_malaysian_phone(message):
-                return (
-                    "Please enter a valid Malaysian phone number.\n"
-                    "Examples: 0123456789 or 60123456789"
-                )
-            self.user_data["phone"] = message
-            self.state = "ask_income"
-            return (
-                f"Thank you! Your phone number is: {message}\n"
-                "May I know your annual income?\n"
-                "(Example: RM 30,000)"
-            )
-
-        # --- Step 8: Ask for income ---
-        if self.state == "ask_income":
-            income = self.parse_income(message)
-            if income is None or income <= 0:
-                return (
-                    "Please enter a valid income amount.\n"
-                    "Example: RM 30000 or 30,000"
-                )
-
-            self.user_data["income"] = income
-
-            # --- Calculations ---
-            age = self.user_data["age"]
-            years_coverage = max(60 - age, 0)
-            recommended_coverage = max(income * 10, 300000)
-
-            if age <= 30:
-                rate = 6
-            elif age <= 40:
-                rate = 8
-            elif age <= 50:
-                rate = 10
-            else:
-                rate = 12
-
-            annual_premium = (recommended_coverage / 1000) * rate
-            monthly_premium = annual_premium / 12
-
-            self.state = "ask_email"
-
-            return (
-                f"Thank you, {self.user_data['name']}! 😊 We really appreciate you taking the time to share a bit about yourself.\n"
-                f"Based on what you’ve told us, here’s a personalised quote created just for you.\n\n"
-                f"📝 *Your Personalised Income Protection Plan* 📝\n"
-                f"{'-' * 38}\n"
-                f"{'Years of Coverage:':25} {years_coverage} years\n"
-                f"{'Recommended Coverage:':25} RM {recommended_coverage:,.2f}\n"
-                f"{'Premium Rate:':25} RM {rate} per RM1,000\n"
-                f"{'Annual Premium:':25} RM {annual_premium:,.2f}\n"
-                f"{'Monthly Premium:':25} RM {monthly_premium:,.2f}\n"
-                f"{'-' * 38}\n\n"
-                "Please type your email address, we will send you an email summary of our conversation for your reference"
-            )
-
-        # --- Step 9: Ask for email ---
-        if self.state == "ask_email":
-            if not self.validate_email(message):
-                return "Please enter a valid email address.\nExample: example@email.com"
-
-            self.user_data["email"] = message
-            # Save to Google Sheets immediately (this will auto-send an email)
-            save_session(self.user_data)
-
-            self.state = "ask_more_info"
-            return (
-                "Thank you! Your email is saved and we will send you a summary via email shortly.\n"
-                "Would you like to find out more on how you can be best protected?\n"
-                "1. Yes\n"
-                "2. No"
-            )
-
-        # --- Step 10: Ask if user wants more info ---
-        if self.state == "ask_more_info":
-            options = {"1": "Yes", "2": "No"}
-            if message not in options:
-                return (
-                    "Please choose a valid option: 1 or 2.\n"
-                    "Would you like to find out more on how you can be best protected?\n"
-                    "1. Yes\n"
-                    "2. No"
-                )
-            self.user_data["more_info"] = options[message]
-            self.state = "done"
-
-            # --- Final messages split into 2 chat bubbles ---
-            final_messages = [
-                "Great! Thank you for signing up. We will contact you soon 😊\n"
-                "Subject to terms and conditions of approved policy after recommendation by authorised representatives.",
-                
-                "Thank you for contacting us. Feel free to reach out to us if you would like more information at https://wa.me/60168357258"
-            ]
-            return "\n\n".join(final_messages)
-
-        # --- Done ---
-        if self.state == "done":
-            return "If you want to calculate again, type *restart*."
-
-        return "I'm not sure what you mean. Please try again."
+        handler = STEPS.get(self.state)
+        if handler is None:
+            return UNKNOWN_STATE_REPLY
+        return handler(self, message)
 
 
+# -------------------------
+# Shared state (one per process, used by the WSGI app and asgi.py)
+# -------------------------
+# Conversation state lives server-side; the cookie only carries the session id.
+# Pick the backend with SGSH_STATE_STORE (memory / sqlite:///path.db / redis://...).
+# With more than one worker process use sqlite or redis, not memory.
+state_store = create_state_store()
+# Last reply per tab, so a resent msg_id is answered without re-running the step
+replay_cache = ReplayCache(state_store)
+
+MAX_TAB_ID_LENGTH = 64
+
+def start_background():
+    # Leads are saved to Google Sheets by background workers (see spool.py);
+    # starting them here also replays anything left queued by a previous run.
+    spool.start_workers()
+    # Open the worksheet, mint the OAuth token, prime SMTP and load the PDF in the
+    # background; /readyz turns 200 once that is done.
+    warmup.start()
+
+def adopt_session(sess):
+    """Session id from the cookie session `sess` (created if missing)."""
+    sid = sess.get('sid')
+    if sid is None:
+        sid = secrets.token_urlsafe(16)
+        sess['sid'] = sid
+
+    # One-off migration of states packed into older cookies
+    legacy = sess.pop('chatbot_states', None) or {}
+    if 'chatbot' in sess:
+        legacy.setdefault('default', sess.pop('chatbot'))
+    for legacy_tab, legacy_state in legacy.items():
+        state_store.set(f"{sid}:{legacy_tab}", legacy_state)
+
+    return sid
+
+def tab_key(sid, data):
+    tab_id = str(data.get('tab_id') or 'default')[:MAX_TAB_ID_LENGTH]
+    return f"{sid}:{tab_id}"
+
+def run_chat(key, message):
+    chatbot = SGSHChatbot.from_state(state_store.get(key))
+    reply = chatbot.process(message)
+    state_store.set(key, chatbot.to_state(text=state_store.serialises))
+    return reply
+
+def handle_chat(sid, data):
+    """
+    Run one message through the tab's chatbot and persist its state. Returns the reply.
+    A message carrying the tab's last msg_id is a replay and gets the cached reply.
+    """
+    key = tab_key(sid, data)
+    msg_id = message_id(data)
+    if msg_id is None:
+        # older clients send no msg_id
+        return run_chat(key, data.get('message', ''))
+
+    with replay_cache.lock(key):
+        reply = replay_cache.lookup(key, msg_id)
+        if reply is None:
+            reply = run_chat(key, data.get('message', ''))
+            replay_cache.remember(key, msg_id, reply)
+    return reply
+
+def handle_reset(sid, data):
+    key = tab_key(sid, data)
+    state_store.delete(key)
+    replay_cache.forget(key)
+
 # -------------------------
 # Flask app setup
 # -------------------------
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'
+bp = Blueprint('chatbot', __name__)
 
-@app.route('/')
+@bp.route('/')
 def Chatbot():
     return render_template('Chatbot.html')
 
-@app.route('/chat', methods=['POST'])
+@bp.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json() or {}
-    message = data.get('message', '')
-    tab_id = data.get('tab_id', 'default')
-
-    states = session.get('chatbot_states', None)
-    if states is None and 'chatbot' in session:
-        states = {'default': session.pop('chatbot')}
-    if states is None:
-        states = {}
-
-    if tab_id not in states:
-        states[tab_id] = SGSHChatbot().__dict__
-
-    chatbot = SGSHChatbot()
-    chatbot.__dict__.update(states[tab_id])
-
-    reply = chatbot.process(message)
-
-    states[tab_id] = chatbot.__dict__
-    session['chatbot_states'] = states
-    session.modified = True
+    reply = handle_chat(adopt_session(session), data)
 
     return jsonify({'reply': reply})
 
-@app.route('/reset', methods=['POST'])
+@bp.route('/reset', methods=['POST'])
 def reset_chat():
     data = request.get_json(silent=True) or {}
-    tab_id = data.get('tab_id', 'default')
-
-    states = session.get('chatbot_states', {})
-    if not states and 'chatbot' in session:
-        states = {'default': session.pop('chatbot')}
-
-    if tab_id in states:
-        states.pop(tab_id, None)
-        session['chatbot_states'] = states
-        session.modified = True
+    handle_reset(adopt_session(session), data)
 
     return jsonify({'status': 'ok'})
 
+@bp.route('/readyz')
+def readyz():
+    # 503 until warm-up (Sheets, token, SMTP, attachment) has had its first pass;
+    # failed steps then show as "degraded" and keep retrying in the background
+    report = warmup.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+@bp.route('/metrics')
+def metrics():
+    # Sheets quota scheduler: calls queued for a token, in flight, retries, 429s
+    # chat_replay: /chat requests with a msg_id, replays answered from cache, and their ratio
+    return jsonify({'sheets': get_scheduler().snapshot(), 'chat_replay': replay_cache.snapshot()})
+
+def create_app():
+    """
+    WSGI app factory, e.g. gunicorn -c gunicorn.conf.py "SatuGajiSatuHarapan:create_app()"
+    (wsgi.py and asgi.py call it too). Starts this process's spool workers and
+    warm-up (each worker process runs its own), so importing this module alone
+    starts nothing.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SGSH_SECRET_KEY', 'your_secret_key_here')
+    app.register_blueprint(bp)
+    start_background()
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only; see wsgi.py / gunicorn.conf.py / asgi.py for production
+    create_app().run(debug=True)
@@ -0,0 +1,152 @@
+# asgi.py
+# ASGI entry point: uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+# (with several workers a `memory` state store is switched to SQLite, as in
+# gunicorn.conf.py; set SGSH_STATE_STORE to redis://... to use Redis instead)
+# /chat and /reset are served as coroutines; their blocking work (state store,
+# and the spool write when a conversation finishes) runs on a bounded I/O
+# thread pool, so a slow save never holds an event-loop or server thread.
+# Every other path (/, static files, /readyz, /metrics) goes to the Flask app.
+
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import CookieError, SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from werkzeug.http import dump_cookie
+
+# uvicorn runs each of several workers (--workers / $WEB_CONCURRENCY) in a
+# spawned child process. Requests for one tab can land on any of them, so
+# keep chat state in a store they all share; this must happen before the app
+# module is imported, since that builds the store. (--reload also serves from
+# a child process; SQLite is just as correct there.)
+if os.environ.get("SGSH_STATE_STORE", "memory") == "memory" and (
+        int(os.environ.get("WEB_CONCURRENCY", 1)) > 1
+        or multiprocessing.parent_process() is not None):
+    os.environ["SGSH_STATE_STORE"] = "sqlite:///chat_state.db"
+
+from SatuGajiSatuHarapan import adopt_session, create_app, handle_chat, handle_reset
+
+IO_THREADS = int(os.environ.get("SGSH_ASGI_IO_THREADS", 32))
+MAX_BODY = 64 * 1024
+
+flask_app = create_app()    # also starts this process's spool workers and warm-up
+_io_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="asgi-io")
+_wsgi = WsgiToAsgi(flask_app)
+
+# -------------------------
+# Flask's signed cookie session, shared with the WSGI routes
+# -------------------------
+_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+_config = flask_app.config
+_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+def load_session(headers):
+    cookie = SimpleCookie()
+    for name, value in headers:
+        if name == b"cookie":
+            try:
+                cookie.load(value.decode("latin-1"))
+            except CookieError:
+                pass
+    morsel = cookie.get(_config["SESSION_COOKIE_NAME"])
+    if morsel is None:
+        return {}
+    try:
+        return dict(_serializer.loads(morsel.value, max_age=_max_age))
+    except BadSignature:
+        return {}
+
+def session_cookie(sess):
+    return dump_cookie(
+        _config["SESSION_COOKIE_NAME"], _serializer.dumps(sess),
+        domain=_config["SESSION_COOKIE_DOMAIN"] or None,
+        path=_config["SESSION_COOKIE_PATH"] or "/",
+        secure=_config["SESSION_COOKIE_SECURE"],
+        httponly=_config["SESSION_COOKIE_HTTPONLY"],
+        samesite=_config["SESSION_COOKIE_SAMESITE"],
+    )
+
+# -------------------------
+# Native routes
+# -------------------------
+def _chat(sess, data):
+    return {"reply": handle_chat(adopt_session(sess), data)}
+
+def _reset(sess, data):
+    handle_reset(adopt_session(sess), data)
+    return {"status": "ok"}
+
+ROUTES = {
+    "/chat": (_chat, True),     # (handler, reject invalid JSON like request.get_json())
+    "/reset": (_reset, False),  # get_json(silent=True)
+}
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY:
+            raise ValueError("request body too large")
+        if not message.get("more_body"):
+            return body
+
+async def send_json(send, status, payload, cookie=None):
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = [(b"content-type", b"application/json"),
+               (b"content-length", str(len(body)).encode())]
+    if cookie:
+        headers.append((b"set-cookie", cookie.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+async def json_route(scope, receive, send, handler, strict):
+    try:
+        body = await read_body(receive)
+    except ValueError as e:
+        await send_json(send, 413, {"error": str(e)})
+        return
+    if body is None:
+        return
+
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        if strict:
+            await send_json(send, 400, {"error": "invalid JSON body"})
+            return
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    sess = load_session(scope["headers"])
+    before = dict(sess)
+    payload = await asyncio.get_running_loop().run_in_executor(_io_pool, handler, sess, data)
+    await send_json(send, 200, payload, session_cookie(sess) if sess != before else None)
+
+async def lifespan(receive, send):
+    # spool workers and warm-up already started by create_app() above
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _io_pool.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    route = ROUTES.get(scope["path"]) if scope["type"] == "http" else None
+    if route is not None and scope["method"] == "POST":
+        await json_route(scope, receive, send, *route)
+        return
+    await _wsgi(scope, receive, send)
@@ -0,0 +1,84 @@
+# attachments.py
+# Process-wide cache of pre-encoded email attachments (e.g. Benefits.pdf)
+# The file is mapped with mmap, hashed and base64-encoded once into the MIME
+# part's wire bytes; every email streams that same buffer. The entry is refreshed when the file's
+# mtime/size change and its SHA-256 no longer matches.
+
+import base64
+import hashlib
+import mimetypes
+import mmap
+import os
+import threading
+
+class CachedAttachment:
+    """One encoded file. `wire` is the full MIME part (headers + base64 body, CRLF)."""
+
+    def __init__(self, path, stamp, digest, encoded):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.stamp = stamp
+        self.digest = digest
+        ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.maintype, self.subtype = ctype.split("/", 1)
+        self.wire = self._wire_bytes(encoded)   # only the wire form is kept
+
+    def _wire_bytes(self, encoded):
+        headers = (
+            f"Content-Type: {self.maintype}/{self.subtype}\r\n"
+            "MIME-Version: 1.0\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            f'Content-Disposition: attachment; filename="{self.filename}"\r\n'
+            "\r\n"
+        )
+        return headers.encode("ascii") + encoded.replace(b"\n", b"\r\n")
+
+def _read_and_encode(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:   # mmap cannot map an empty file
+            return hashlib.sha256(b"").hexdigest(), b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest = hashlib.sha256(mm).hexdigest()
+            encoded = base64.encodebytes(mm)
+    return digest, encoded
+
+class AttachmentCache:
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Cached attachment for `path`, or None if the file does not exist."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        entry = self._entries.get(path)
+        if entry is not None and entry.stamp == stamp:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stamp == stamp:
+                return entry
+            with open(path, "rb") as f:
+                if entry is not None and st.st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        digest = hashlib.sha256(mm).hexdigest()
+                    if digest == entry.digest:
+                        # touched but unchanged: keep the encoded buffer
+                        entry.stamp = stamp
+                        return entry
+            digest, encoded = _read_and_encode(path)
+            entry = CachedAttachment(path, stamp, digest, encoded)
+            self._entries[path] = entry
+            print(f"[Email] Cached attachment {entry.filename} ({st.st_size:,} bytes)")
+            return entry
+
+_cache = AttachmentCache()
+
+def get_attachment(path):
+    return _cache.get(path)
@@ -0,0 +1,42 @@
+# bench_dob.py
+# DOB parsing + age calculation: strptime version vs validators.calculate_age
+# Run from the repo root: python benchmarks/bench_dob.py
+
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from validators import calculate_age
+
+N = 100000
+
+# Original SGSHChatbot.calculate_age
+def calculate_age_strptime(dob_str):
+    try:
+        dob = datetime.strptime(dob_str, "%d/%m/%Y")
+        today = datetime.today()
+        age = today.year - dob.year - (
+            (today.month, today.day) < (dob.month, dob.day)
+        )
+        return age
+    except ValueError:
+        return None
+
+CASES = [
+    ("valid", "25/12/1990"),
+    ("spaced", "25 / 12 / 1990"),
+    ("dashed", "25-12-1990"),
+    ("invalid", "31/02/1990"),
+    ("garbage", "my birthday"),
+]
+
+if __name__ == "__main__":
+    print(f"{'input':10} {'strptime':>12} {'fast path':>12}   accepted (old / new)")
+    for label, text in CASES:
+        old = min(timeit.repeat(lambda: calculate_age_strptime(text), number=N, repeat=3)) / N * 1e6
+        new = min(timeit.repeat(lambda: calculate_age(text), number=N, repeat=3)) / N * 1e6
+        accepted = (calculate_age_strptime(text) is not None, calculate_age(text) is not None)
+        print(f"{label:10} {old:9.2f} us {new:9.2f} us   {accepted[0]!s:5} / {accepted[1]!s:5}")
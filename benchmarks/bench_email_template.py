@@ -0,0 +1,280 @@
+# bench_email_template.py
+# Rendering the summary email for 10k sheet rows
+#   fstring  : the original build_email_html (f-string + v() per field)
+#   compiled : emailtemplate.CompiledTemplate + rowschema.FieldResolver
+#   fields   : just the field lookups, v() per field vs the cached resolver plan
+# Also checks that the compiled output equals the minified original.
+# Run from the repo root: python benchmarks/bench_email_template.py
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from emailtemplate import SUMMARY_FIELDS, compile_summary, minify_html, summary_fields
+
+N = 10000
+SENDER_NAME = "Erica – Income Protection Advisor"
+
+# Header row as written by googlesheet.HEADERS
+HEADERS = ["Name", "DOB", "Age", "Life Stage", "Dependents", "Protection Level",
+           "Monthly Budget", "Phone", "Income", "Email", "WhatsApp Link",
+           "Session Date", "Email_sent"]
+
+def make_rows(n):
+    rnd = random.Random(7)
+    stages = ["Single", "Married", "I have a young child / Children", "Nearing Retirement"]
+    rows = []
+    for i in range(n):
+        values = [f"Lead {i} 😊", "25/12/1990", rnd.randint(18, 60), rnd.choice(stages),
+                  "3-4 person", "Basic employee coverage", "RM201 - RM500",
+                  f"60123{i:06d}", rnd.randint(24000, 240000), f"lead{i}@example.com",
+                  "https://wa.me/60123456789", "18/10/2026", ""]
+        if i % 10 == 0:
+            values[3] = ""      # missing fields render as "—"
+        rows.append(dict(zip(HEADERS, values)))
+    return rows
+
+# -------------------------
+# Before (Emailservice.py prior to emailtemplate)
+# -------------------------
+def v(row, key):
+    """Robust getter: try multiple variants and do case-insensitive matching."""
+    if not row:
+        return "—"
+    if key in row and row.get(key):
+        return row.get(key)
+    def norm(s): return str(s).lower().replace(" ", "").replace("_", "")
+    target = norm(key)
+    for existing in row.keys():
+        if norm(existing) == target:
+            val = row.get(existing)
+            return val if val else "—"
+    alt_map = {
+        "LifeStage": ["Life Stage", "life_stage"],
+        "ProtectionLevel": ["Protection Level", "protection_level"],
+        "MonthlyBudget": ["Monthly Budget", "monthly_budget"],
+        "Whatsapp": ["Whatsapp", "WhatsApp", "wa_link", "WhatsApp Link"],
+        "Name": ["name"],
+        "Income": ["income"],
+        "Phone": ["phone"],
+        "Dependents": ["dependents"],
+        "Email": ["email", "Email Address"],
+        "Age": ["age"]
+    }
+    for k, alts in alt_map.items():
+        if norm(key) == norm(k):
+            for a in alts:
+                for existing in row.keys():
+                    if norm(existing) == norm(a):
+                        val = row.get(existing)
+                        return val if val else "—"
+    return "—"
+
+# -------------------------------------------------
+# Helper for modern table rows
+# -------------------------------------------------
+def row_item(label, value):
+    return f"""
+    <tr>
+        <td style="
+            padding:12px 10px;
+            color:#6b7280;
+            border-bottom:1px solid #e5e7eb;
+            width:45%;
+        ">
+            {label}
+        </td>
+        <td style="
+            padding:12px 10px;
+            font-weight:600;
+            border-bottom:1px solid #e5e7eb;
+            color:#111827;
+        ">
+            {value}
+        </td>
+    </tr>
+    """
+
+# -------------------------------------------------
+# BUILD EMAIL HTML (Modern UI)
+# -------------------------------------------------
+def build_email_html(row):
+    # Fixed WhatsApp number
+    whatsapp_number = "+60168357258"
+    whatsapp_link = f"https://wa.me/{whatsapp_number.lstrip('+')}"
+
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+
+<body style="
+    margin:0;
+    padding:0;
+    background:#f4f6fb;
+    font-family:'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
+    color:#1f2937;
+">
+
+<table width="100%" cellpadding="0" cellspacing="0">
+<tr>
+<td align="center" style="padding:40px 15px;">
+
+    <!-- Card -->
+    <table width="100%" style="
+        max-width:600px;
+        background:#ffffff;
+        border-radius:16px;
+        box-shadow:0 10px 30px rgba(0,0,0,0.08);
+        overflow:hidden;
+    ">
+
+        <!-- Header -->
+        <tr>
+        <td style="
+            background:linear-gradient(135deg,#2563eb,#1e40af);
+            padding:28px 30px;
+            color:#ffffff;
+        ">
+            <h1 style="
+                margin:0;
+                font-size:22px;
+                font-weight:600;
+            ">
+                Your Income Protection Summary
+            </h1>
+            <p style="
+                margin:6px 0 0;
+                opacity:0.9;
+                font-size:14px;
+            ">
+                Satu Gaji Satu Harapan
+            </p>
+        </td>
+        </tr>
+
+        <!-- Body -->
+        <tr>
+        <td style="padding:30px;">
+
+            <p style="font-size:16px;margin-top:0;">
+                Hi <b>{v(row,'Name')}</b> 👋
+            </p>
+
+            <p style="color:#4b5563;">
+                Thank you for completing your personalised income protection review.
+                Here’s a clear summary prepared just for you:
+            </p>
+
+            <!-- Info Table -->
+            <table width="100%" cellpadding="0" cellspacing="0" style="
+                margin:25px 0;
+                border-collapse:collapse;
+                font-size:14px;
+            ">
+
+                {row_item("Age", v(row,'Age'))}
+                {row_item("Life Stage", v(row,'LifeStage'))}
+                {row_item("Dependents", v(row,'Dependents'))}
+                {row_item("Protection Level", v(row,'ProtectionLevel'))}
+                {row_item("Monthly Budget", v(row,'MonthlyBudget'))}
+                {row_item("Annual Income", v(row,'Income'))}
+                {row_item("Phone", v(row,'Phone'))}
+
+            </table>
+
+            <!-- CTA -->
+            <div style="
+                background:#f1f5f9;
+                padding:18px;
+                border-radius:12px;
+                text-align:center;
+                margin-top:30px;
+            ">
+                <p style="margin:0 0 10px;font-size:15px;">
+                    Our licensed advisor will reach out to you shortly.
+                </p>
+
+                <a href="{whatsapp_link}" style="
+                    display:inline-block;
+                    padding:12px 22px;
+                    background:#22c55e;
+                    color:#ffffff;
+                    text-decoration:none;
+                    font-weight:600;
+                    border-radius:999px;
+                    font-size:14px;
+                ">
+                    💬 Chat on WhatsApp
+                </a>
+            </div>
+
+        </td>
+        </tr>
+
+        <!-- Footer -->
+        <tr>
+        <td style="
+            padding:22px 30px;
+            background:#f9fafb;
+            border-top:1px solid #e5e7eb;
+            font-size:12px;
+            color:#6b7280;
+        ">
+            <p style="margin:0 0 10px;">
+                Subject to policy terms and final approval by authorised representatives.
+            </p>
+
+            <p style="margin:0;">
+                Warm regards,<br>
+                <b>{SENDER_NAME}</b>
+            </p>
+        </td>
+        </tr>
+
+    </table>
+
+</td>
+</tr>
+</table>
+
+</body>
+</html>
+"""
+
+# -------------------------
+# After
+# -------------------------
+TEMPLATE = compile_summary(SENDER_NAME)
+
+def build_compiled(row):
+    return TEMPLATE.render(summary_fields(row))
+
+def build_compiled_bytes(row):
+    return TEMPLATE.render_bytes(summary_fields(row))
+
+def bench(label, build, rows):
+    start = time.perf_counter()
+    for row in rows:
+        build(row)
+    elapsed = time.perf_counter() - start
+    print(f"{label:16} {elapsed * 1000:8.1f} ms  {elapsed / len(rows) * 1e6:7.2f} us/row")
+    return elapsed
+
+if __name__ == "__main__":
+    rows = make_rows(N)
+    for row in rows[:200]:
+        assert build_compiled(row) == minify_html(build_email_html(row)), row
+    before = bench("fstring", build_email_html, rows)
+    after = bench("compiled", build_compiled, rows)
+    bench("compiled bytes", build_compiled_bytes, rows)
+    bench("fields v()", lambda row: [v(row, f) for f in SUMMARY_FIELDS], rows)
+    bench("fields resolver", summary_fields, rows)
+    print(f"size: {len(build_email_html(rows[0]).encode())} B -> "
+          f"{len(build_compiled_bytes(rows[0]))} B, speed-up x{before / after:.1f}")
@@ -0,0 +1,74 @@
+# bench_import.py
+# Cold-start cost of a worker, measured in fresh interpreters
+#   importtime : cumulative `python -X importtime` figure for each module
+#   first GET  : interpreter start -> create_app() -> GET / answered
+# Also lists which heavy dependencies each import drags in; none of them
+# should be loaded (and no ServiceAccount.json needed) before the first
+# Sheets call or email send.
+# Run from the repo root: python benchmarks/bench_import.py
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODULES = ["SatuGajiSatuHarapan", "googlesheet", "Emailservice"]
+HEAVY = ["gspread", "google.oauth2", "google.auth", "smtplib", "email.mime"]
+REPEAT = 5
+
+FIRST_GET = """
+import time
+start = time.perf_counter()
+from SatuGajiSatuHarapan import create_app
+status = create_app().test_client().get("/").status_code
+print(status, time.perf_counter() - start)
+"""
+
+def run(args, cwd):
+    # warm-up deliberately loads gspread/smtplib in the background; keep it
+    # out of the import measurement
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT), SGSH_WARMUP="0")
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+
+def importtime(module, cwd):
+    """Cumulative import time of `module` in microseconds (best of REPEAT)."""
+    best = None
+    for _ in range(REPEAT):
+        stderr = run(["-X", "importtime", "-c", f"import {module}"], cwd).stderr
+        for line in stderr.splitlines():
+            parts = [p.strip() for p in line.split("|")]
+            if len(parts) == 3 and parts[2] == module:
+                cumulative = int(parts[1])
+                best = cumulative if best is None else min(best, cumulative)
+    return best
+
+def heavy_loaded(module, cwd):
+    code = (f"import sys, {module}; "
+            f"print(' '.join(m for m in {HEAVY!r} if m in sys.modules))")
+    return run(["-c", code], cwd).stdout.split()
+
+def first_get(cwd):
+    best_import = best_wall = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        status, elapsed = run(["-c", FIRST_GET], cwd).stdout.split()
+        wall = time.perf_counter() - start
+        assert status == "200", status
+        best_import = float(elapsed) if best_import is None else min(best_import, float(elapsed))
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+    return best_import, best_wall
+
+if __name__ == "__main__":
+    # An empty working directory: no ServiceAccount.json, fresh SQLite files
+    with tempfile.TemporaryDirectory() as cwd:
+        for module in MODULES:
+            us = importtime(module, cwd)
+            heavy = heavy_loaded(module, cwd)
+            print(f"{module:22} importtime {us / 1000:7.1f} ms   heavy: {', '.join(heavy) or '-'}")
+        in_process, wall = first_get(cwd)
+        print(f"{'first GET /':22} {in_process * 1000:7.1f} ms in-process, "
+              f"{wall * 1000:7.1f} ms incl. interpreter start")
@@ -0,0 +1,116 @@
+# bench_send_memory.py
+# Peak Python memory of sending the summary email, 1 and 32 sends in flight
+#   mime   : MIMEMultipart + freshly encoded PDF, flattened by smtp.send_message (original)
+#   stream : mimestream chunks + cached attachment, written straight to the DATA stream
+# A discarding SMTP sink runs in a child process so its buffers are not counted.
+# Run from the repo root: python benchmarks/bench_send_memory.py [path/to/Benefits.pdf]
+
+import multiprocessing
+import os
+import socketserver
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from email import encoders
+from email.header import Header
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from attachments import get_attachment
+from mimestream import iter_email_chunks
+from smtppool import SMTPPool
+
+SENDS_PER_THREAD = 2
+SENDER = ("Erica – Income Protection Advisor", "bench@example.com")
+SUBJECT = "Your Personalised Income Protection Summary"
+HTML = "<html><body>" + "<p>Hi Nur Aisyah 😊, here is your summary.</p>" * 200 + "</body></html>"
+
+# -------------------------
+# Discarding SMTP sink (child process)
+# -------------------------
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 sink\r\n")
+        for line in self.rfile:
+            cmd = line.strip().upper()
+            if cmd == b"DATA":
+                self.wfile.write(b"354 go\r\n")
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                self.wfile.write(b"250 ok\r\n")
+            elif cmd == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+def _serve(port_queue):
+    socketserver.ThreadingTCPServer.daemon_threads = True
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SinkHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+# -------------------------
+# Senders
+# -------------------------
+def send_mime(pool, path, to_email):
+    msg = MIMEMultipart()
+    msg["From"] = formataddr(SENDER, charset="utf-8")
+    msg["To"] = to_email
+    msg["Subject"] = Header(SUBJECT, "utf-8").encode()
+    msg.attach(MIMEText(HTML, "html", "utf-8"))
+    with open(path, "rb") as f:
+        part = MIMEBase("application", "pdf")
+        part.set_payload(f.read())
+    encoders.encode_base64(part)
+    part.add_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+    msg.attach(part)
+    pool.send_message(msg)
+
+def send_stream(pool, path, to_email):
+    chunks = iter_email_chunks(*SENDER, to_email, SUBJECT, HTML, get_attachment(path))
+    pool.send_stream(SENDER[1], [to_email], chunks)
+
+def run(label, sender, pool, path, concurrency):
+    def work(i):
+        for _ in range(SENDS_PER_THREAD):
+            sender(pool, path, f"lead{i}@example.com")
+
+    sender(pool, path, "warmup@example.com")   # connections, caches, imports
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(concurrency)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sends = concurrency * SENDS_PER_THREAD
+    print(f"{label:7} x{concurrency:<3} peak {peak / 2**20:8.1f} MiB   "
+          f"{sends / elapsed:6.1f} emails/s")
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "Benefits.pdf"
+    print(f"{os.path.basename(path)}: {os.path.getsize(path):,} bytes")
+
+    ports = multiprocessing.Queue()
+    sink = multiprocessing.Process(target=_serve, args=(ports,), daemon=True)
+    sink.start()
+    port = ports.get()
+    try:
+        for concurrency in (1, 32):
+            pool = SMTPPool("127.0.0.1", port, starttls=False, size=concurrency)
+            run("mime", send_mime, pool, path, concurrency)
+            run("stream", send_stream, pool, path, concurrency)
+            pool.close()
+    finally:
+        sink.terminate()
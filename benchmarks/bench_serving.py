@@ -0,0 +1,142 @@
+# bench_serving.py
+# Requests/sec against worker count, for the production entry points
+#   gunicorn : gunicorn -c gunicorn.conf.py wsgi:app (gthread workers)
+#   uvicorn  : uvicorn asgi:app --workers N
+# Each client keeps its own cookie and keep-alive connection and loops a
+# short conversation (reset + three /chat steps). State is in SQLite so
+# every worker sees every tab; warm-up is off (no Google/SMTP needed).
+# Run from the repo root: python benchmarks/bench_serving.py [workers ...]
+
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+WORKERS = [int(w) for w in sys.argv[1:]] or [1, 2, 4]
+CLIENT_PROCESSES = 4
+CLIENTS_PER_PROCESS = 8
+DURATION = 10           # seconds of load per run
+PORT = 8765
+SCRIPT = ["hi", "Ali", "25/12/1990"]
+
+def server_command(kind, workers):
+    if kind == "gunicorn":
+        return ["gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+                "-b", f"127.0.0.1:{PORT}", "-w", str(workers),
+                "--access-logfile", "/dev/null", "wsgi:app"]
+    return ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(PORT),
+            "--workers", str(workers), "--no-access-log", "--log-level", "warning"]
+
+def wait_ready(timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=2)
+            conn.request("GET", "/readyz")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+# -------------------------
+# Load generator (runs in CLIENT_PROCESSES processes x CLIENTS_PER_PROCESS threads)
+# -------------------------
+def client_loop(tab, deadline, results):
+    conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    latencies = []
+    errors = 0
+    while time.monotonic() < deadline:
+        for path, message in [("/reset", None)] + [("/chat", m) for m in SCRIPT]:
+            payload = {"tab_id": tab} if message is None else {"tab_id": tab, "message": message}
+            start = time.perf_counter()
+            try:
+                conn.request("POST", path, json.dumps(payload), headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                errors += 1
+            cookie = response.getheader("Set-Cookie")
+            if cookie:
+                headers["Cookie"] = cookie.split(";", 1)[0]
+    results.append((latencies, errors))
+
+def client_process(index, deadline, queue):
+    import threading
+    results = []
+    threads = [threading.Thread(target=client_loop, args=(f"p{index}t{i}", deadline, results))
+               for i in range(CLIENTS_PER_PROCESS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies = [x for lat, _ in results for x in lat]
+    queue.put((latencies, sum(err for _, err in results)))
+
+def run_load():
+    queue = multiprocessing.Queue()
+    deadline = time.monotonic() + DURATION
+    procs = [multiprocessing.Process(target=client_process, args=(i, deadline, queue))
+             for i in range(CLIENT_PROCESSES)]
+    start = time.monotonic()
+    for p in procs:
+        p.start()
+    latencies, errors = [], 0
+    for _ in procs:
+        lat, err = queue.get()
+        latencies += lat
+        errors += err
+    for p in procs:
+        p.join()
+    elapsed = time.monotonic() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    return len(latencies) / elapsed, p50, p99, errors
+
+def bench(kind, workers):
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, PYTHONPATH=ROOT, SGSH_WARMUP="0",
+                   SGSH_STATE_STORE=f"sqlite:///{os.path.join(cwd, 'chat_state.db')}",
+                   SGSH_RATE_TABLE=os.path.join(ROOT, "rates.json"),
+                   SGSH_SPOOL_WORKERS="1")
+        server = subprocess.Popen(server_command(kind, workers), cwd=cwd, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready()
+            rps, p50, p99, errors = run_load()
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    print(f"{kind:9} workers={workers:<2} {rps:8.1f} req/s   p50 {p50 * 1000:6.1f} ms   "
+          f"p99 {p99 * 1000:6.1f} ms   errors {errors}")
+
+def available(kind):
+    return shutil.which(kind) is not None
+
+if __name__ == "__main__":
+    with socket.socket() as s:
+        if s.connect_ex(("127.0.0.1", PORT)) == 0:
+            sys.exit(f"port {PORT} is in use")
+    print(f"{os.cpu_count()} CPU(s), {CLIENT_PROCESSES * CLIENTS_PER_PROCESS} clients, {DURATION}s per run")
+    for kind in ("gunicorn", "uvicorn"):
+        if not available(kind):
+            print(f"{kind}: not installed, skipped")
+            continue
+        for workers in WORKERS:
+            bench(kind, workers)
@@ -0,0 +1,106 @@
+# bench_state.py
+# Before/after cost of persisting one tab's chatbot state per request
+#   cookie : every tab's SGSHChatbot.__dict__ in the Flask signed cookie (original)
+#   dict   : one tab's __dict__ as JSON in the server-side store
+#   tuple  : chatstate.pack() tuple as JSON in the server-side store
+#   text   : chatstate.pack_text() line, stored verbatim by SQLite / Redis
+#   memory : chatstate.pack() tuple held as-is by the in-process store
+# Through JSON the tuple is ~3x smaller than the dict but costs about the same
+# CPU (decode a little more), so SQLite and Redis get the text line instead:
+# as small, with encode about half and decode about 3/4 of the dict's time.
+# Run from the repo root: python benchmarks/bench_state.py
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from chatstate import pack, pack_text, unpack
+
+N = 20000
+
+# A tab that has reached the last step: the largest state we store
+LEGACY_STATE = {
+    "state": "ask_more_info",
+    "user_data": {
+        "name": "Nur Aisyah binti Ahmad",
+        "dob": "25/12/1990",
+        "age": 35,
+        "life_stage": "I have a young child / Children",
+        "dependents": "3-4 person",
+        "protection_level": "Basic employee coverage",
+        "budget": "RM201 - RM500",
+        "phone": "0123456789",
+        "income": 84000,
+        "email": "nur.aisyah@example.com",
+    },
+}
+
+def dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+# -------------------------
+# Before
+# -------------------------
+app = Flask(__name__)
+app.secret_key = "bench"
+COOKIE = SecureCookieSessionInterface().get_signing_serializer(app)
+
+def cookie_case(tabs):
+    def encode():
+        states = {f"tab_{i}": {"state": LEGACY_STATE["state"],
+                               "user_data": dict(LEGACY_STATE["user_data"])}
+                  for i in range(tabs)}
+        return COOKIE.dumps({"chatbot_states": states})
+
+    def decode(raw):
+        return COOKIE.loads(raw)["chatbot_states"]["tab_0"]
+
+    return encode, decode
+
+def dict_encode():
+    return dumps({"state": LEGACY_STATE["state"], "user_data": dict(LEGACY_STATE["user_data"])})
+
+def dict_decode(raw):
+    attrs = json.loads(raw)
+    return attrs["state"], attrs["user_data"]
+
+# -------------------------
+# After
+# -------------------------
+def tuple_encode():
+    return dumps(pack(LEGACY_STATE["state"], LEGACY_STATE["user_data"]))
+
+def tuple_decode(raw):
+    return unpack(json.loads(raw))
+
+def text_encode():
+    return pack_text(LEGACY_STATE["state"], LEGACY_STATE["user_data"])
+
+def memory_encode():
+    return pack(LEGACY_STATE["state"], LEGACY_STATE["user_data"])
+
+def size(raw):
+    if isinstance(raw, tuple):
+        return len(dumps(raw).encode())
+    return len(raw.encode() if isinstance(raw, str) else raw)
+
+def bench(label, encode, decode):
+    raw = encode()
+    enc = min(timeit.repeat(encode, number=N, repeat=3)) / N * 1e6
+    dec = min(timeit.repeat(lambda: decode(raw), number=N, repeat=3)) / N * 1e6
+    print(f"{label:16} encode {enc:7.2f} us   decode {dec:7.2f} us   size {size(raw):5d} B")
+    return raw
+
+if __name__ == "__main__":
+    bench("cookie (1 tab)", *cookie_case(1))
+    bench("cookie (5 tabs)", *cookie_case(5))
+    before = bench("dict json", dict_encode, dict_decode)
+    after = bench("tuple json", tuple_encode, tuple_decode)
+    text = bench("text", text_encode, unpack)
+    bench("tuple memory", memory_encode, unpack)
+    assert tuple_decode(after) == dict_decode(before) == unpack(text)
@@ -0,0 +1,321 @@
+# conversation.py
+# Table-driven conversation flow for the SGSH chatbot
+# The flow is declared once as data (FLOW) and compiled at import into
+# STEPS: state -> handler, so each message costs one dict lookup
+
+import sys
+import validators
+from quote import current_engine
+
+# -------------------------
+# Input parsers
+# Each returns (fields, None) on success or (None, error_reply)
+# -------------------------
+def parse_name(bot, message):
+    if not message:
+        return None, "Please enter your name to continue."
+    return {"name": message}, None
+
+def parse_dob(bot, message):
+    if not message:
+        return None, "You did not enter anything.\nPlease enter your Date of Birth (DD/MM/YYYY)."
+
+    age = validators.calculate_age(message)
+    if age is None:
+        return None, (
+            "Invalid date format, please try again ❌\n"
+            "Please enter your Date of Birth as DD/MM/YYYY\n"
+            "Example: 25/12/1990"
+        )
+    if age < 18:
+        return None, (
+            f"You are {age} years old.\n"
+            "Sorry, this service is only available for users aged 18 and above."
+        )
+    if age >= 80:
+        return None, (
+            f"You are {age} years old.\n"
+            "Sorry, this service is only available for users below 80 years old."
+        )
+    return {"dob": message, "age": age}, None
+
+def parse_phone(bot, message):
+    phone = validators.normalise_phone(message)
+    if phone is None:
+        return None, (
+            "Please enter a valid Malaysian phone number.\n"
+            "Examples: 0123456789 or 60123456789"
+        )
+    return {"phone": phone}, None
+
+def parse_income(bot, message):
+    income = validators.parse_income(message)
+    if income is None or income <= 0:
+        return None, (
+            "Please enter a valid income amount.\n"
+            "Example: RM 30000 or 30,000"
+        )
+    return {"income": income}, None
+
+def parse_email(bot, message):
+    if not validators.validate_email(message):
+        return None, "Please enter a valid email address.\nExample: example@email.com"
+    return {"email": message}, None
+
+# -------------------------
+# Side effects
+# -------------------------
+def save_lead(data):
+    # import locally to avoid import-time side-effects (Google credentials)
+    from googlesheet import save_session
+    save_session(data)
+
+# -------------------------
+# Quote shown after the income step
+# -------------------------
+def quote_reply(data):
+    q = current_engine().quote(data["age"], data["income"])
+    # saved with the lead so each row records which rate table priced it
+    data["rate_table"] = q["table_version"]
+    years_coverage = q["years_coverage"]
+    recommended_coverage = q["recommended_coverage"]
+    rate = q["rate"]
+    annual_premium = q["annual_premium"]
+    monthly_premium = q["monthly_premium"]
+
+    return (
+        f"Thank you, {data['name']}! 😊 We really appreciate you taking the time to share a bit about yourself.\n"
+        f"Based on what you’ve told us, here’s a personalised quote created just for you.\n\n"
+        f"📝 *Your Personalised Income Protection Plan* 📝\n"
+        f"{'-' * 38}\n"
+        f"{'Years of Coverage:':25} {years_coverage} years\n"
+        f"{'Recommended Coverage:':25} RM {recommended_coverage:,.2f}\n"
+        f"{'Premium Rate:':25} RM {rate} per RM1,000\n"
+        f"{'Annual Premium:':25} RM {annual_premium:,.2f}\n"
+        f"{'Monthly Premium:':25} RM {monthly_premium:,.2f}\n"
+        f"{'-' * 38}\n"
+    )
+
+# -------------------------
+# Flow definition
+#   state    : state name stored on the chatbot
+#   question : text shown when entering the step (options are appended)
+#   retry    : question used when re-asking after an invalid option
+#   options  : ordered (key, label) pairs; the label is stored under `field`
+#   parse    : parser for free-text steps (None = accept anything)
+#   action   : side effect run with user_data once the step succeeds
+#   ack      : reply on success (str.format over user_data, or a callable)
+#   next     : state to move to; its question is appended to the ack
+#   reply    : fixed reply for terminal steps
+# -------------------------
+FLOW = [
+    {
+        "state": "start",
+        "ack": "Hello! I'm Erica, your super agent that will guide you today 😊",
+        "next": "ask_name",
+    },
+    {
+        "state": "ask_name",
+        "question": "May I know your name?",
+        "parse": parse_name,
+        "ack": "Hello, {name}! Nice to meet you! Let’s get to know you better. 😊",
+        "next": "ask_dob",
+    },
+    {
+        "state": "ask_dob",
+        "question": "May I know your Date of Birth?\n(Format: DD / MM / YYYY )",
+        "parse": parse_dob,
+        "ack": (
+            "Great! You are {age} years old.\n"
+            "It is the perfect age to start building a strong foundation for your future savings."
+        ),
+        "next": "ask_life_stage",
+    },
+    {
+        "state": "ask_life_stage",
+        "question": "May I know what is your current life stage?",
+        "retry": "What is your current life stage?",
+        "field": "life_stage",
+        "options": [
+            ("1", "Just married"),
+            ("2", "I have a young child / Children"),
+            ("3", "Nearing Retirement"),
+            ("4", "Single and independent"),
+        ],
+        "ack": "Thank you! Your life stage is: {life_stage}",
+        "next": "ask_dependents",
+    },
+    {
+        "state": "ask_dependents",
+        "question": "How many dependents do you have?",
+        "field": "dependents",
+        "options": [
+            ("1", "1 only"),
+            ("2", "1-2 person"),
+            ("3", "3-4 person"),
+            ("4", "More than 4 person"),
+        ],
+        "ack": "Thank you! You have {dependents} dependents.",
+        "next": "ask_protection_level",
+    },
+    {
+        "state": "ask_protection_level",
+        "question": "What is your current level of protection?",
+        "field": "protection_level",
+        "options": [
+            ("1", "No coverage at all"),
+            ("2", "Basic employee coverage"),
+            ("3", "Some personal coverage"),
+            ("4", "Comprehensive coverage"),
+        ],
+        "ack": "Thank you! Your protection level is: {protection_level}",
+        "next": "ask_budget",
+    },
+    {
+        "state": "ask_budget",
+        "question": "May I know your budget for monthly premium?",
+        "field": "budget",
+        "options": [
+            ("1", "Less than RM200"),
+            ("2", "RM201 - RM500"),
+            ("3", "RM501 - RM1000"),
+            ("4", "More than RM1000"),
+        ],
+        "ack": "Thank you! Your monthly budget is: {budget}",
+        "next": "ask_phone",
+    },
+    {
+        "state": "ask_phone",
+        "question": (
+            "Please enter your phone number so we can provide you with updates "
+            "from time to time on suitable offers and packages."
+        ),
+        "parse": parse_phone,
+        "ack": "Thank you! Your phone number is: {phone}",
+        "next": "ask_income",
+    },
+    {
+        "state": "ask_income",
+        "question": "May I know your annual income?\n(Example: RM 30,000)",
+        "parse": parse_income,
+        "ack": quote_reply,
+        "next": "ask_email",
+    },
+    {
+        "state": "ask_email",
+        "question": (
+            "Please type your email address, we will send you an email summary "
+            "of our conversation for your reference"
+        ),
+        "parse": parse_email,
+        # Save to Google Sheets immediately (this will auto-send an email)
+        "action": save_lead,
+        "ack": "Thank you! Your email is saved and we will send you a summary via email shortly.",
+        "next": "ask_more_info",
+    },
+    {
+        "state": "ask_more_info",
+        "question": "Would you like to find out more on how you can be best protected?",
+        "field": "more_info",
+        "options": [
+            ("1", "Yes"),
+            ("2", "No"),
+        ],
+        # Final messages split into 2 chat bubbles
+        "ack": "\n\n".join([
+            "Great! Thank you for signing up. We will contact you soon 😊\n"
+            "Subject to terms and conditions of approved policy after recommendation by authorised representatives.",
+
+            "Thank you for contacting us. Feel free to reach out to us if you would like more information at https://wa.me/60168357258",
+        ]),
+        "next": "done",
+    },
+    {
+        "state": "done",
+        "reply": "If you want to calculate again, type *restart*.",
+    },
+]
+
+UNKNOWN_STATE_REPLY = "I'm not sure what you mean. Please try again."
+
+# -------------------------
+# Compiler
+# -------------------------
+def _menu(options):
+    return "\n".join(f"{key}. {label}" for key, label in options)
+
+def _choices(keys):
+    if len(keys) <= 2:
+        return " or ".join(keys)
+    return ", ".join(keys[:-1]) + ", or " + keys[-1]
+
+def _prompt(step):
+    """Full text shown when a step is entered, or None for terminal steps."""
+    question = step.get("question")
+    if question is None:
+        return None
+    if "options" in step:
+        return f"{question}\n{_menu(step['options'])}"
+    return question
+
+def _renderer(ack):
+    if callable(ack):
+        return ack
+    if "{" not in ack:
+        return lambda data: ack
+    return lambda data: ack.format(**data)
+
+def _compile_step(step, steps_by_state):
+    if "reply" in step:
+        reply = sys.intern(step["reply"])
+        return lambda bot, message: reply
+
+    next_state = step["next"]
+    next_prompt = _prompt(steps_by_state[next_state])
+    tail = sys.intern("\n" + next_prompt) if next_prompt else ""
+    render = _renderer(step["ack"])
+
+    if "options" in step:
+        options = dict(step["options"])
+        field = step["field"]
+        invalid = sys.intern(
+            f"Please choose a valid option: {_choices([k for k, _ in step['options']])}.\n"
+            f"{step.get('retry', step['question'])}\n"
+            f"{_menu(step['options'])}"
+        )
+
+        def handle_option(bot, message):
+            label = options.get(message)
+            if label is None:
+                return invalid
+            bot.user_data[field] = label
+            bot.state = next_state
+            return render(bot.user_data) + tail
+
+        return handle_option
+
+    parse = step.get("parse")
+    action = step.get("action")
+
+    def handle_input(bot, message):
+        if parse is not None:
+            fields, error = parse(bot, message)
+            if error is not None:
+                return error
+            bot.user_data.update(fields)
+        if action is not None:
+            action(bot.user_data)
+        bot.state = next_state
+        return render(bot.user_data) + tail
+
+    return handle_input
+
+def compile_flow(flow):
+    """Compile a flow definition into a {state: handler(bot, message)} table."""
+    steps_by_state = {step["state"]: step for step in flow}
+    return {
+        sys.intern(step["state"]): _compile_step(step, steps_by_state)
+        for step in flow
+    }
+
+STEPS = compile_flow(FLOW)
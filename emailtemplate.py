@@ -0,0 +1,267 @@
+# emailtemplate.py
+# Precompiled HTML template for the summary email
+# The template is minified and split into static segments and slot indexes
+# once at import; rows are turned into a fixed field vector by a
+# rowschema.FieldResolver, and rendering is one join.
+
+import re
+
+from rowschema import FieldResolver
+
+# -------------------------------------------------
+# Template engine
+# -------------------------------------------------
+SLOT = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_STYLE_ATTR = re.compile(r'style="([^"]*)"')
+_STYLE_PUNCT = re.compile(r"\s*([;:,])\s*")
+_WHITESPACE = re.compile(r"\s+")
+_BETWEEN_TAGS = re.compile(r">\s+<")
+
+def _minify_style(match):
+    css = _STYLE_PUNCT.sub(r"\1", _WHITESPACE.sub(" ", match.group(1)).strip())
+    return f'style="{css.rstrip(";")}"'
+
+def minify_html(html):
+    """Drop comments and collapse whitespace (inline CSS included); no <pre> support."""
+    html = _COMMENT.sub("", html)
+    html = _STYLE_ATTR.sub(_minify_style, html)
+    html = _BETWEEN_TAGS.sub("><", _WHITESPACE.sub(" ", html))
+    return html.strip()
+
+class CompiledTemplate:
+    """
+    `source` uses {{name}} placeholders. Names in `constants` are inlined at
+    compile time (their values may contain further slots); every other
+    name must be in `fields` and is filled per render from a value vector
+    aligned with `fields`.
+    """
+
+    __slots__ = ("fields", "segments", "slots", "byte_segments")
+
+    def __init__(self, source, fields, constants=None, minify=True):
+        constants = constants or {}
+        source = SLOT.sub(lambda m: str(constants.get(m.group(1), m.group(0))), source)
+        if minify:
+            source = minify_html(source)
+
+        self.fields = tuple(fields)
+        position = {name: i for i, name in enumerate(self.fields)}
+        parts = []
+        slots = []
+        last = 0
+        for m in SLOT.finditer(source):
+            name = m.group(1)
+            if name not in position:
+                raise KeyError(f"Template slot {name!r} is not a field or constant")
+            parts.append(source[last:m.start()])
+            slots.append((len(parts), position[name]))
+            parts.append(None)
+            last = m.end()
+        parts.append(source[last:])
+
+        self.segments = tuple(parts)
+        self.byte_segments = tuple(None if p is None else p.encode("utf-8") for p in parts)
+        self.slots = tuple(slots)
+
+    def render(self, values):
+        """`values`: strings aligned with `fields`."""
+        parts = list(self.segments)
+        for pos, idx in self.slots:
+            parts[pos] = values[idx]
+        return "".join(parts)
+
+    def render_bytes(self, values):
+        """UTF-8 rendering; only the slot values are encoded per call."""
+        parts = list(self.byte_segments)
+        for pos, idx in self.slots:
+            parts[pos] = values[idx].encode("utf-8")
+        return b"".join(parts)
+
+# -------------------------------------------------
+# Summary email
+# -------------------------------------------------
+SUMMARY_FIELDS = ("Name", "Age", "LifeStage", "Dependents", "ProtectionLevel",
+                  "MonthlyBudget", "Income", "Phone")
+
+WHATSAPP_NUMBER = "+60168357258"    # fixed WhatsApp number
+WHATSAPP_LINK = f"https://wa.me/{WHATSAPP_NUMBER.lstrip('+')}"
+
+INFO_ROWS = [
+    ("Age", "Age"),
+    ("Life Stage", "LifeStage"),
+    ("Dependents", "Dependents"),
+    ("Protection Level", "ProtectionLevel"),
+    ("Monthly Budget", "MonthlyBudget"),
+    ("Annual Income", "Income"),
+    ("Phone", "Phone"),
+]
+
+# Helper for modern table rows
+def row_item(label, value):
+    return f"""
+    <tr>
+        <td style="
+            padding:12px 10px;
+            color:#6b7280;
+            border-bottom:1px solid #e5e7eb;
+            width:45%;
+        ">
+            {label}
+        </td>
+        <td style="
+            padding:12px 10px;
+            font-weight:600;
+            border-bottom:1px solid #e5e7eb;
+            color:#111827;
+        ">
+            {value}
+        </td>
+    </tr>
+    """
+
+SUMMARY_SOURCE = """
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+
+<body style="
+    margin:0;
+    padding:0;
+    background:#f4f6fb;
+    font-family:'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
+    color:#1f2937;
+">
+
+<table width="100%" cellpadding="0" cellspacing="0">
+<tr>
+<td align="center" style="padding:40px 15px;">
+
+    <!-- Card -->
+    <table width="100%" style="
+        max-width:600px;
+        background:#ffffff;
+        border-radius:16px;
+        box-shadow:0 10px 30px rgba(0,0,0,0.08);
+        overflow:hidden;
+    ">
+
+        <!-- Header -->
+        <tr>
+        <td style="
+            background:linear-gradient(135deg,#2563eb,#1e40af);
+            padding:28px 30px;
+            color:#ffffff;
+        ">
+            <h1 style="
+                margin:0;
+                font-size:22px;
+                font-weight:600;
+            ">
+                Your Income Protection Summary
+            </h1>
+            <p style="
+                margin:6px 0 0;
+                opacity:0.9;
+                font-size:14px;
+            ">
+                Satu Gaji Satu Harapan
+            </p>
+        </td>
+        </tr>
+
+        <!-- Body -->
+        <tr>
+        <td style="padding:30px;">
+
+            <p style="font-size:16px;margin-top:0;">
+                Hi <b>{{Name}}</b> 👋
+            </p>
+
+            <p style="color:#4b5563;">
+                Thank you for completing your personalised income protection review.
+                Here’s a clear summary prepared just for you:
+            </p>
+
+            <!-- Info Table -->
+            <table width="100%" cellpadding="0" cellspacing="0" style="
+                margin:25px 0;
+                border-collapse:collapse;
+                font-size:14px;
+            ">
+
+                {{info_rows}}
+
+            </table>
+
+            <!-- CTA -->
+            <div style="
+                background:#f1f5f9;
+                padding:18px;
+                border-radius:12px;
+                text-align:center;
+                margin-top:30px;
+            ">
+                <p style="margin:0 0 10px;font-size:15px;">
+                    Our licensed advisor will reach out to you shortly.
+                </p>
+
+                <a href="{{whatsapp_link}}" style="
+                    display:inline-block;
+                    padding:12px 22px;
+                    background:#22c55e;
+                    color:#ffffff;
+                    text-decoration:none;
+                    font-weight:600;
+                    border-radius:999px;
+                    font-size:14px;
+                ">
+                    💬 Chat on WhatsApp
+                </a>
+            </div>
+
+        </td>
+        </tr>
+
+        <!-- Footer -->
+        <tr>
+        <td style="
+            padding:22px 30px;
+            background:#f9fafb;
+            border-top:1px solid #e5e7eb;
+            font-size:12px;
+            color:#6b7280;
+        ">
+            <p style="margin:0 0 10px;">
+                Subject to policy terms and final approval by authorised representatives.
+            </p>
+
+            <p style="margin:0;">
+                Warm regards,<br>
+                <b>{{sender_name}}</b>
+            </p>
+        </td>
+        </tr>
+
+    </table>
+
+</td>
+</tr>
+</table>
+
+</body>
+</html>
+"""
+
+summary_fields = FieldResolver(SUMMARY_FIELDS)
+
+def compile_summary(sender_name):
+    """The summary email with the sender name and WhatsApp link baked in."""
+    return CompiledTemplate(SUMMARY_SOURCE, SUMMARY_FIELDS, constants={
+        "info_rows": "".join(row_item(label, f"{{{{{field}}}}}") for label, field in INFO_ROWS),
+        "whatsapp_link": WHATSAPP_LINK,
+        "sender_name": sender_name,
+    })
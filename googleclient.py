@@ -0,0 +1,100 @@
+# googleclient.py
+# One lazily created gspread client per process, shared by googlesheet.py and
+# Emailservice.py. gspread / google-auth take a few hundred ms to import and
+# need ServiceAccount.json, so neither happens until the first Sheets call.
+# The client's HTTP session keeps a pool of keep-alive connections sized for
+# the spool workers, and the OAuth token can be refreshed in the background
+# ahead of expiry instead of inline on a user's request.
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# -----------------------------
+# Config
+# -----------------------------
+SERVICE_ACCOUNT_FILE = os.environ.get("SGSH_SERVICE_ACCOUNT_FILE", "ServiceAccount.json")
+
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+HTTP_POOL_SIZE = int(os.environ.get("SGSH_HTTP_POOL_SIZE", 16))   # keep-alive connections per host
+TOKEN_REFRESH_MARGIN = 300      # refresh when the token has less than this left (seconds)
+TOKEN_CHECK_INTERVAL = 60
+
+_client = None
+_creds = None
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_token_session = None
+_refresher = None
+
+def get_client():
+    """The shared, authorised gspread client (thread-safe, created on first use)."""
+    global _client, _creds
+    client = _client
+    if client is None:
+        with _lock:
+            if _client is None:
+                # import locally to keep gspread / google-auth out of cold start
+                import gspread
+                from google.oauth2.service_account import Credentials
+                from requests.adapters import HTTPAdapter
+                _creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPE)
+                client = gspread.authorize(_creds)
+                session = getattr(getattr(client, "http_client", client), "session", None)
+                if session is not None:
+                    session.mount("https://", HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE))
+                _client = client
+                print("[Google Sheets] Client authorised")
+            client = _client
+    return client
+
+# -----------------------------
+# OAuth token refresh
+# -----------------------------
+def token_seconds_left():
+    """Seconds until the current access token expires (0 if there is none yet)."""
+    get_client()
+    if not _creds.token or _creds.expiry is None:
+        return 0
+    now = datetime.now(timezone.utc).replace(tzinfo=None)   # google-auth uses naive UTC
+    return max(0, (_creds.expiry - now).total_seconds())
+
+def refresh_token(margin=TOKEN_REFRESH_MARGIN):
+    """Mint a new access token if the current one expires within `margin` seconds."""
+    global _token_session
+    if token_seconds_left() > margin:
+        return False
+    import requests
+    from google.auth.transport.requests import Request
+    with _refresh_lock:
+        if token_seconds_left() > margin:     # refreshed by another thread meanwhile
+            return False
+        if _token_session is None:
+            _token_session = requests.Session()  # keep-alive to the token endpoint
+        _creds.refresh(Request(session=_token_session))
+    print(f"[Google Sheets] Access token refreshed ({token_seconds_left():.0f}s left)")
+    return True
+
+def _refresh_loop(margin, interval):
+    while True:
+        try:
+            refresh_token(margin)
+        except Exception as e:
+            print(f"[Google Sheets] Token refresh failed: {e}")
+        time.sleep(interval)
+
+def start_token_refresher(margin=TOKEN_REFRESH_MARGIN, interval=TOKEN_CHECK_INTERVAL):
+    """Keep the token fresh from a daemon thread (once per process)."""
+    global _refresher
+    with _lock:
+        if _refresher is None:
+            _refresher = threading.Thread(
+                target=_refresh_loop, args=(margin, interval),
+                name="token-refresher", daemon=True,
+            )
+            _refresher.start()
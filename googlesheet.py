@@ -1,26 +1,30 @@
 # googlesheet_campaign1.py
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
+import os
+import threading
+import time
+from googleclient import get_client
+from sheetsquota import ScheduledWorksheet, api_status, get_scheduler, sheets_call
+from sheetwriter import SheetWriter
+from leadindex import SENT_FORMAT, LeadIndex, column_letter, email_key, parse_sent, phone_key
 
 # -----------------------------
 # Google Sheets Setup
 # -----------------------------
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-CREDS = Credentials.from_service_account_file(
-    "ServiceAccount.json",  # Path to your Service Account JSON
-    scopes=SCOPE
-)
-
-client = gspread.authorize(CREDS)
-
+# The client is created on first use (googleclient.py); importing this
+# module needs neither gspread nor ServiceAccount.json.
 SPREADSHEET_NAME = "ChatBotData"
 WORKSHEET_NAME = "Campaign1"
 
+# Repeat leads (same email as an earlier row) rewrite that row instead of
+# appending; a lead with only the phone in common gets a row of its own. Either
+# way the summary email is not resent within RESEND_WINDOW seconds.
+DEDUPE_LEADS = os.environ.get("SGSH_LEAD_DEDUPE", "1") != "0"
+RESEND_WINDOW = int(os.environ.get("SGSH_RESEND_WINDOW", 24 * 60 * 60))
+# Rows added to the sheet outside write_session (by hand, or a save whose
+# response was lost) are indexed by a background sync this often
+LEAD_SYNC_INTERVAL = int(os.environ.get("SGSH_LEAD_SYNC_INTERVAL", 300))
+
 # Columns: match your chatbot session data + tracking
 HEADERS = [
     "Name",
@@ -35,43 +39,234 @@ HEADERS = [
     "Email",
     "Timestamp",
     "Whatsapp",      # Swapped position
-    "Email_sent"     # Swapped position
+    "Email_sent",    # Swapped position
+    "Rate Table",    # version of rates.json that priced the quote
 ]
+EMAIL_SENT_COL = HEADERS.index("Email_sent") + 1
 
 # -----------------------------
 # Initialize Sheet
 # -----------------------------
+_headers_checked = False
+
+def ensure_headers(sheet):
+    """
+    Write the header row if the sheet has none, or the trailing headers
+    added since it was created. Reads row 1 only.
+    """
+    existing = sheet.row_values(1)
+    if not existing:
+        sheet.update(values=[HEADERS], range_name="A1")
+    elif len(existing) < len(HEADERS) and existing == HEADERS[:len(existing)]:
+        missing = HEADERS[len(existing):]
+        sheet.update(values=[missing], range_name=f"{column_letter(len(existing) + 1)}1")
+
 def init_sheet():
-    """Ensure spreadsheet, worksheet, and headers exist."""
+    """Ensure spreadsheet, worksheet, and (once per process) headers exist."""
+    global _headers_checked
+    import gspread
+    client = get_client()
     try:
-        sh = client.open(SPREADSHEET_NAME)
+        sh = sheets_call("read", client.open, SPREADSHEET_NAME)
     except gspread.SpreadsheetNotFound:
-        sh = client.create(SPREADSHEET_NAME)
+        sh = sheets_call("write", client.create, SPREADSHEET_NAME)
 
     try:
-        sheet = sh.worksheet(WORKSHEET_NAME)
+        sheet = sheets_call("read", sh.worksheet, WORKSHEET_NAME)
     except gspread.WorksheetNotFound:
-        sheet = sh.add_worksheet(
+        sheet = sheets_call(
+            "write", sh.add_worksheet,
             title=WORKSHEET_NAME,
             rows=1000,
             cols=len(HEADERS)
         )
+    # every call made through the handle is quota-scheduled and retried (sheetsquota.py)
+    sheet = ScheduledWorksheet(sheet, get_scheduler())
 
-    all_values = sheet.get_all_values()
-    if not all_values:
-        sheet.append_row(HEADERS)
+    if not _headers_checked:
+        ensure_headers(sheet)
+        _headers_checked = True
 
     return sheet
 
+# -----------------------------
+# Buffered row writer
+# -----------------------------
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Process-wide SheetWriter for the Campaign1 worksheet."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SheetWriter(get_sheet)
+        return _writer
+
+# -----------------------------
+# Cached worksheet handle and header map
+# -----------------------------
+SHEET_CACHE_TTL = 600   # seconds before the handle / header map are refetched
+
+_sheet = None
+_sheet_expires = 0.0
+_header_maps = {}       # worksheet id -> (expires, {normalised header: column}, headers)
+_cache_lock = threading.Lock()
+
+def normalise_header(name):
+    return str(name).lower().replace(" ", "").replace("_", "")
+
+def get_sheet():
+    """Campaign1 worksheet handle, opened once and reused until the TTL or invalidation."""
+    global _sheet, _sheet_expires
+    with _cache_lock:
+        now = time.monotonic()
+        if _sheet is None or now >= _sheet_expires:
+            _sheet = init_sheet()
+            _sheet_expires = now + SHEET_CACHE_TTL
+        return _sheet
+
+def _header_entry(sheet):
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _header_maps.get(sheet.id)
+        if entry is not None and entry[0] > now:
+            return entry
+
+    headers = tuple(sheet.row_values(1))
+    header_map = {}
+    for col, header in enumerate(headers, start=1):
+        header_map.setdefault(normalise_header(header), col)
+
+    entry = (now + SHEET_CACHE_TTL, header_map, headers)
+    with _cache_lock:
+        _header_maps[sheet.id] = entry
+    return entry
+
+def get_header_map(sheet=None):
+    """{normalised header: 1-based column} for `sheet` (default Campaign1), cached."""
+    return _header_entry(sheet or get_sheet())[1]
+
+def get_headers(sheet=None):
+    """The header row of `sheet` as a tuple (cached with the header map)."""
+    return _header_entry(sheet or get_sheet())[2]
+
+def invalidate_sheet_cache():
+    """Drop the cached handle and header maps (e.g. after the sheet layout changed)."""
+    global _sheet
+    with _cache_lock:
+        _sheet = None
+        _header_maps.clear()
+
+def is_schema_error(e):
+    """True for API errors that mean our cached view of the sheet is stale."""
+    import gspread
+    if isinstance(e, (gspread.WorksheetNotFound, gspread.SpreadsheetNotFound)):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        return api_status(e) in (400, 404)
+    return False
+
+def handle_api_error(e):
+    if is_schema_error(e):
+        print(f"[Google Sheets] Schema error, dropping cached sheet: {e}")
+        invalidate_sheet_cache()
+
+# -----------------------------
+# Local email / lead id -> row index
+# -----------------------------
+_lead_index = None
+_lead_index_lock = threading.Lock()
+_lead_syncer = None
+
+def get_lead_index():
+    """Process-wide LeadIndex, caught up with rows appended since the last sync."""
+    global _lead_index, _lead_syncer
+    with _lead_index_lock:
+        if _lead_index is None:
+            index = LeadIndex()
+            sync_lead_index(index)
+            _lead_index = index
+        if _lead_syncer is None:
+            _lead_syncer = threading.Thread(
+                target=_lead_sync_loop, args=(LEAD_SYNC_INTERVAL,),
+                name="lead-index-sync", daemon=True,
+            )
+            _lead_syncer.start()
+        return _lead_index
+
+def _lead_sync_loop(interval):
+    # keeps the save path free of reads: write_session only consults the index
+    while True:
+        time.sleep(interval)
+        try:
+            sync_lead_index()
+        except Exception as e:
+            print(f"[Google Sheets] Lead index sync failed: {e}")
+
+def sync_lead_index(index=None, rebuild=False):
+    """Index rows appended since the last sync (every row, from scratch, if `rebuild`)."""
+    index = index or get_lead_index()
+    sheet = get_sheet()
+    email_col = get_col_index(sheet, "Email")
+    if email_col:
+        cols = (email_col, get_col_index(sheet, "Phone"), get_col_index(sheet, "Email_sent"))
+        if rebuild:
+            index.rebuild(sheet, *cols)
+        else:
+            index.sync(sheet, *cols)
+
+def check_lead_row(sheet, row, email, phone):
+    """
+    Read `row` and check it still holds this lead. Returns (matched, last_sent)
+    where matched is "email" or "phone", or None if neither cell matches.
+    """
+    cells = sheet.row_values(row)
+
+    def cell(header):
+        col = get_col_index(sheet, header)
+        return cells[col - 1] if col and col <= len(cells) else ""
+
+    if email_key(email) and email_key(cell("Email")) == email_key(email):
+        matched = "email"
+    elif phone_key(phone) and phone_key(cell("Phone")) == phone_key(phone):
+        matched = "phone"
+    else:
+        return None
+    return matched, parse_sent(cell("Email_sent"))
+
+def find_lead(sheet, index, email, phone):
+    """
+    (row, matched, last_sent) of an earlier row for this lead, or None.
+    A new lead costs no network; a repeat one reads its row once to confirm
+    it. A row holding someone else means rows were deleted or re-sorted by
+    hand: the keys are re-read from SQLite (another worker may have fixed
+    them already), then the index is rebuilt from the sheet.
+    """
+    def rebuild():
+        print("[Google Sheets] Lead index is out of date with the sheet, rebuilding")
+        sync_lead_index(index, rebuild=True)
+
+    checked = set()
+    for recover in (index.forget_cached, rebuild, None):
+        row = index.lookup_lead(email, phone)
+        if row is None:
+            return None
+        if row not in checked:
+            checked.add(row)
+            found = check_lead_row(sheet, row, email, phone)
+            if found is not None:
+                return (row, *found)
+        if recover is None:
+            return None
+        recover()
+
 # -----------------------------
 # Helper: Get column index by header
 # -----------------------------
 def get_col_index(sheet, header_name):
     """Return 1-based column index for a given header name."""
-    headers = sheet.row_values(1)
-    if header_name in headers:
-        return headers.index(header_name) + 1
-    return None
+    return get_header_map(sheet).get(normalise_header(header_name))
 
 # -----------------------------
 # Generate WhatsApp Link
@@ -87,10 +282,40 @@ def generate_whatsapp_link(phone):
 # -----------------------------
 def save_session(session_data, email_sent=False):
     """
-    Append a new row for the chatbot session.
+    Queue the chatbot session for saving and return immediately.
+    The row is written (and the email sent) by the spool workers, see spool.py.
+    """
+    from spool import enqueue_lead
+    enqueue_lead(session_data, email_sent=email_sent)
+    return session_data.get("email")  # For optional email updates
+
+def rewrite_row(sheet, row_number, values, keep_col=None):
+    """
+    Overwrite an existing row with `values` (from column A) in one call,
+    leaving column `keep_col` (1-based) as it is.
+    """
+    runs = [(1, values)]
+    if keep_col:
+        runs = [(1, values[:keep_col - 1]), (keep_col + 1, values[keep_col:])]
+    data = [
+        {
+            "range": f"{column_letter(start)}{row_number}:"
+                     f"{column_letter(start + len(part) - 1)}{row_number}",
+            "values": [part],
+        }
+        for start, part in runs if part
+    ]
+    sheet.batch_update(data, value_input_option="RAW")
+
+def write_session(session_data, email_sent=False, lead_id=None):
+    """
+    Save the chatbot session: append a new row, or rewrite the row of an
+    earlier lead with the same email or phone (see leadindex.py).
     `session_data` is a dict containing the user responses.
+    `lead_id` identifies the session in the local lead index, so a retry
+    rewrites the row its earlier attempt appended (even with de-dupe off).
     """
-    sheet = init_sheet()
+    sheet = get_sheet()
 
     timestamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     email_ts = datetime.now().strftime("%d/%m/%Y %H:%M:%S") if email_sent else ""
@@ -131,34 +356,72 @@ def save_session(session_data, email_sent=False):
         session_data.get("email", ""),
         timestamp,    # Timestamp
         wa_link,      # Whatsapp link
-        email_ts      # Email_sent
+        email_ts,     # Email_sent
+        session_data.get("rate_table", ""),
     ]
 
-    all_values = sheet.get_all_values()
-    next_row = len(all_values) + 1
-    sheet.insert_row(row, next_row)
-    print(f"[Google Sheets] Row added for {session_data.get('name', '')} at row {next_row}")
+    email = session_data.get("email", "") or ""
+    email = email.strip()
+    phone = session_data.get("phone", "")
+
+    index = get_lead_index()
+    with index.lead_lock(email, phone):
+        earlier = None
+        if lead_id:
+            # a spool retry whose earlier attempt already wrote this lead's row
+            own = index.lookup_session(lead_id)
+            found = check_lead_row(sheet, own, email, phone) if own is not None else None
+            if found is not None:
+                earlier = (own, "session", found[1])
+        if earlier is None and DEDUPE_LEADS:
+            earlier = find_lead(sheet, index, email, phone)
+        # the lead's own row or one with the same email is rewritten; one that
+        # shares just the phone belongs to an earlier lead of its own and is kept
+        existing = earlier[0] if earlier is not None and earlier[1] != "phone" else None
+        # this person's summary went out within the window (to this or another address)
+        last_sent = (earlier[2] or index.sent_at(earlier[0])) if earlier is not None else None
+        recently_sent = last_sent is not None and time.time() - last_sent < RESEND_WINDOW
+        if existing is None and recently_sent and not email_ts:
+            # the new row carries the earlier send, so the poller skips it too
+            row[EMAIL_SENT_COL - 1] = time.strftime(SENT_FORMAT, time.localtime(last_sent))
+        try:
+            if existing is None:
+                # Buffered: concurrent saves share one append_rows call
+                next_row = get_writer().append(row).result()
+            else:
+                # Keep the earlier Email_sent unless this save carries its own
+                next_row = existing
+                rewrite_row(sheet, next_row, row, keep_col=None if email_ts else EMAIL_SENT_COL)
+        except Exception as e:
+            handle_api_error(e)
+            raise
+        index.add(next_row, email=email, session_id=lead_id, phone=phone)
+        if email_ts:
+            index.mark_sent(next_row)
+        elif existing is None and recently_sent:
+            index.mark_sent(next_row, when=last_sent)
+
+    action = "added" if existing is None else "updated"
+    print(f"[Google Sheets] Row {action} for {session_data.get('name', '')} at row {next_row}")
 
     # -----------------------------------------
     # Auto-send email (if email provided)
     # -----------------------------------------
-    email = session_data.get("email", "") or ""
-    email = email.strip()
+    if email and recently_sent:
+        print(f"[Email] Summary already sent for this lead at row {earlier[0]}, not resending")
+        email = ""
     if email:
         try:
             # import locally to avoid import-time side-effects
             from Emailservice import build_email_html, send_email, update_email_sent as es_update
-            # prepare a row dict so the Emailservice template can read values
+            # canonical field names (rowschema) so the template resolves them directly
             row_dict = {
                 "Name": session_data.get("name", ""),
                 "Age": session_data.get("age", ""),
                 "LifeStage": session_data.get("life_stage", ""),
-                "Life Stage": session_data.get("life_stage", ""),
                 "Dependents": session_data.get("dependents", ""),
                 "ProtectionLevel": session_data.get("protection_level", ""),
-                "Protection Level": session_data.get("protection_level", ""),
                 "MonthlyBudget": session_data.get("budget", ""),
-                "Monthly Budget": session_data.get("budget", ""),
                 "Income": income_str,
                 "Phone": session_data.get("phone", ""),
                 "Whatsapp": wa_link,
@@ -173,6 +436,7 @@ def save_session(session_data, email_sent=False):
             except Exception:
                 # fallback: update by email finder
                 update_email_sent(email)
+            index.mark_sent(next_row)
             print(f"[Email] Sent summary to {email}")
         except Exception as e:
             print(f"[Email] Failed to send email to {email}: {e}")
@@ -183,21 +447,29 @@ def save_session(session_data, email_sent=False):
 # Update Email_sent timestamp
 # -----------------------------
 def update_email_sent(email):
-    """Update Email_sent timestamp for a specific email."""
-    sheet = init_sheet()
-    email_col = get_col_index(sheet, "Email")
+    """Update Email_sent timestamp for a specific email (latest row for that address)."""
+    sheet = get_sheet()
     email_sent_col = get_col_index(sheet, "Email_sent")
 
-    if not email_col or not email_sent_col:
-        print("[Google Sheets] Header Email or Email_sent not found.")
+    if not email_sent_col:
+        print("[Google Sheets] Header Email_sent not found.")
         return
 
-    all_values = sheet.get_all_values()
-    for idx, row in enumerate(all_values, start=1):
-        if len(row) >= email_col and row[email_col - 1].strip() == email.strip():
-            email_ts = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            sheet.update_cell(idx, email_sent_col, email_ts)
-            print(f"[Google Sheets] Email_sent timestamp updated at row {idx}")
-            return
+    index = get_lead_index()
+    idx = index.lookup_email(email)
+    if idx is None:
+        # Row may have been added by another process or by hand
+        sync_lead_index(index)
+        idx = index.lookup_email(email)
+    if idx is None:
+        print(f"[Google Sheets] No matching email found to update Email_sent for {email}.")
+        return
 
-    print(f"[Google Sheets] No matching email found to update Email_sent for {email}.")
+    email_ts = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    try:
+        sheet.update_cell(idx, email_sent_col, email_ts)
+    except Exception as e:
+        handle_api_error(e)
+        raise
+    index.mark_sent(idx)
+    print(f"[Google Sheets] Email_sent timestamp updated at row {idx}")
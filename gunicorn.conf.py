@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Worker and thread counts come from SGSH_WORKERS / SGSH_THREADS.
+
+import multiprocessing
+import os
+
+bind = os.environ.get("SGSH_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("SGSH_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("SGSH_THREADS", 8))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Each worker starts its own spool and warm-up threads, so import the app
+# after forking rather than in the master.
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+
+# Requests for one tab can land on any worker: keep chat state in a store all
+# workers share. The spool, lead index and quota buckets already use SQLite.
+if workers > 1 and os.environ.get("SGSH_STATE_STORE", "memory") == "memory":
+    os.environ["SGSH_STATE_STORE"] = "sqlite:///chat_state.db"
@@ -0,0 +1,270 @@
+# leadindex.py
+# Local index from lead keys to Campaign1 row numbers
+# Keys: lower-cased email ("email:<address>"), canonical phone
+# ("phone:60XXXXXXXXX") and lead/session id ("session:<id>"). It also keeps
+# when each row was last emailed, so a repeat visitor's lead can update their
+# existing row and skip the resend (see googlesheet.write_session).
+# Lookups hit an in-memory dict and fall back to SQLite, which every worker
+# process on the host writes to, so a lead saved by another worker is found
+# too. The sync watermark is shared the same way: each sync reads (in one
+# batch_get of the Email, Phone and Email_sent columns) only the rows
+# appended since any process last synced.
+# lead_lock() claims the lead's keys in the same file, so two workers saving
+# the same person take turns and the second finds the first one's row.
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+from validators import normalise_email, normalise_phone
+
+# -----------------------------
+# Config
+# -----------------------------
+LEAD_INDEX_PATH = os.environ.get("SGSH_LEAD_INDEX_PATH", "lead_index.db")
+SENT_FORMAT = "%d/%m/%Y %H:%M:%S"     # Email_sent cells, as written by Emailservice
+LOCK_STRIPES = 64
+INDEX_VERSION = 2       # 2: phone keys and sent times; older files are re-read once
+# a claim older than this belongs to a dead or stuck worker and may be taken over
+CLAIM_TIMEOUT = float(os.environ.get("SGSH_LEAD_CLAIM_TIMEOUT", 120))
+
+def column_letter(col):
+    """1 -> A, 27 -> AA"""
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def email_key(email):
+    email = normalise_email(email or "")
+    return f"email:{email}" if email else None
+
+def phone_key(phone):
+    phone = normalise_phone(phone or "")
+    return f"phone:{phone}" if phone else None
+
+def lead_keys(email=None, phone=None):
+    """Index keys identifying one person, email first."""
+    return [key for key in (email_key(email), phone_key(phone)) if key]
+
+def parse_sent(value):
+    """Epoch seconds of an Email_sent cell, or None if it is empty or unreadable."""
+    try:
+        return time.mktime(datetime.strptime(str(value).strip(), SENT_FORMAT).timetuple())
+    except ValueError:
+        return None
+
+class LeadIndex:
+    """Thread-safe; the SQLite file may also be shared by worker processes."""
+
+    def __init__(self, path=LEAD_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS leads (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # row -> epoch seconds of the last summary email
+        conn.execute("CREATE TABLE IF NOT EXISTS sent (row INTEGER PRIMARY KEY, at REAL NOT NULL)")
+        # key -> worker currently looking up / writing that lead (see lead_lock)
+        conn.execute("CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, owner TEXT NOT NULL, at REAL NOT NULL)")
+        self._rows = dict(conn.execute("SELECT key, row FROM leads"))
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.synced_through = self._meta("synced_through", 1)   # row 1 holds the headers
+        if self._meta("version", 1) < INDEX_VERSION:
+            # an older file has no phone keys or sent times: re-read every row
+            # on the next sync (keys are overwritten, nothing is deleted)
+            self._set_meta("synced_through", 1)
+            self._set_meta("version", INDEX_VERSION)
+            self.synced_through = 1
+
+    def _meta(self, name, default):
+        found = self._conn().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return found[0] if found else default
+
+    def _set_meta(self, name, value):
+        self._conn().execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # -----------------------------
+    # Lookups (no network)
+    # -----------------------------
+    def _get(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            # another worker process may have added it since we loaded
+            found = self._conn().execute("SELECT row FROM leads WHERE key = ?", (key,)).fetchone()
+            if found is not None:
+                row = found[0]
+                with self._lock:
+                    self._rows[key] = row
+        return row
+
+    def lookup_email(self, email):
+        key = email_key(email)
+        return self._get(key) if key else None
+
+    def lookup_phone(self, phone):
+        key = phone_key(phone)
+        return self._get(key) if key else None
+
+    def lookup_session(self, session_id):
+        return self._get(f"session:{session_id}") if session_id else None
+
+    def lookup_lead(self, email=None, phone=None):
+        """Row of an earlier lead with the same email or, failing that, phone."""
+        for key in lead_keys(email, phone):
+            row = self._get(key)
+            if row is not None:
+                return row
+        return None
+
+    def sent_at(self, row):
+        """When `row` was last emailed (epoch seconds), if known. Shared by all workers."""
+        found = self._conn().execute("SELECT at FROM sent WHERE row = ?", (row,)).fetchone()
+        return found[0] if found else None
+
+    @contextmanager
+    def lead_lock(self, email=None, phone=None):
+        """
+        Context manager held while one lead is looked up and written, so two
+        saves for the same person, in this process or another one sharing the
+        file, cannot both append a row: the second waits, then finds the row
+        the first one added.
+        """
+        keys = lead_keys(email, phone)
+        owner = uuid.uuid4().hex
+        with ExitStack() as stack:
+            for stripe in sorted({hash(key) % LOCK_STRIPES for key in keys}):
+                stack.enter_context(self._stripes[stripe])
+            delay = 0.02
+            while keys and not self._claim(keys, owner):
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+            try:
+                yield
+            finally:
+                if keys:
+                    self._conn().executemany(
+                        "DELETE FROM claims WHERE key = ? AND owner = ?",
+                        [(key, owner) for key in keys],
+                    )
+
+    def _claim(self, keys, owner):
+        """Claim every key in `keys` for `owner` at once. False if another worker holds one."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM claims WHERE at < ?", (now - CLAIM_TIMEOUT,))
+            marks = ",".join("?" * len(keys))
+            held = conn.execute(
+                f"SELECT 1 FROM claims WHERE key IN ({marks}) AND owner != ? LIMIT 1",
+                (*keys, owner),
+            ).fetchone()
+            if held is None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO claims (key, owner, at) VALUES (?, ?, ?)",
+                    [(key, owner, now) for key in keys],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return held is None
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+    def _put(self, pairs):
+        """pairs: list of (key, row). The newest row wins for repeated keys."""
+        if not pairs:
+            return
+        with self._lock:
+            self._rows.update(pairs)
+            self._conn().executemany(
+                "INSERT OR REPLACE INTO leads (key, row) VALUES (?, ?)", pairs
+            )
+
+    def add(self, row, email=None, session_id=None, phone=None):
+        """Record a row we just appended (or rewrote for a repeat lead)."""
+        pairs = [(key, row) for key in lead_keys(email, phone)]
+        if session_id:
+            pairs.append((f"session:{session_id}", row))
+        self._put(pairs)
+
+    def forget_cached(self):
+        """Drop this process's copy of the keys; lookups re-read them from SQLite."""
+        with self._lock:
+            self._rows.clear()
+
+    def mark_sent(self, row, when=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sent (row, at) VALUES (?, ?)",
+            (row, when if when is not None else time.time()),
+        )
+
+    def sync(self, sheet, email_col, phone_col=None, sent_col=None):
+        """
+        Index rows appended to `sheet` since the last sync, reading only the
+        email (and, if given, phone and Email_sent) columns below the
+        watermark in one batch_get. Returns the number of rows read.
+        Rows another process already synced are skipped; their keys are
+        read through from SQLite.
+        """
+        with self._lock:
+            self.synced_through = max(self.synced_through, self._meta("synced_through", 1))
+        start = self.synced_through + 1
+        cols = [email_col, phone_col, sent_col]
+        wanted = [col for col in cols if col]
+        ranges = [f"{column_letter(col)}{start}:{column_letter(col)}" for col in wanted]
+        fetched = dict(zip(wanted, sheet.batch_get(ranges)))
+
+        def cell(col, offset):
+            values = fetched.get(col) or []
+            if col and offset < len(values) and values[offset]:
+                return values[offset][0]
+            return None
+
+        count = max((len(values) for values in fetched.values()), default=0)
+        pairs, sent = [], {}
+        for offset in range(count):
+            row = start + offset
+            pairs += [(key, row) for key in lead_keys(cell(email_col, offset), cell(phone_col, offset))]
+            sent_value = cell(sent_col, offset)
+            when = parse_sent(sent_value) if sent_value else None
+            if when is not None:
+                sent[row] = when
+        self._put(pairs)
+        self._conn().executemany("INSERT OR REPLACE INTO sent (row, at) VALUES (?, ?)", sent.items())
+        with self._lock:
+            self.synced_through = start + count - 1
+            self._set_meta("synced_through", self.synced_through)
+        return count
+
+    def rebuild(self, sheet, email_col, phone_col=None, sent_col=None):
+        """
+        Forget everything (session ids included) and re-read the whole columns,
+        after rows were moved or deleted by hand. Affects every process using
+        the file; not run at startup.
+        """
+        with self._lock:
+            self._rows.clear()
+            self.synced_through = 1
+            conn = self._conn()
+            conn.execute("DELETE FROM leads")
+            conn.execute("DELETE FROM sent")
+            self._set_meta("synced_through", 1)
+        return self.sync(sheet, email_col, phone_col, sent_col)
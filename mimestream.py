@@ -0,0 +1,48 @@
+# mimestream.py
+# Chunked MIME generation for the summary email
+# Yields the message (headers, base64 HTML part, cached attachment part) as
+# fixed-size byte chunks in wire format (CRLF), for smtppool.stream_data.
+# Nothing larger than one chunk plus the encoded HTML is built per email;
+# the attachment bytes come from the shared attachments cache.
+
+import base64
+import uuid
+from email.header import Header
+from email.utils import formataddr
+
+CHUNK_SIZE = 64 * 1024
+
+def _b64_lines(data):
+    # 76-character base64 lines, as email.encoders.encode_base64 produces
+    return base64.encodebytes(data).replace(b"\n", b"\r\n")
+
+def iter_email_chunks(sender_name, sender_addr, to_email, subject, html, attachment=None,
+                      chunk_size=CHUNK_SIZE):
+    """
+    `html` is a str or UTF-8 bytes; `attachment` is an
+    attachments.CachedAttachment (or None).
+    Produces a multipart/mixed message equivalent to the MIMEMultipart one.
+    """
+    boundary = f"===============sgsh{uuid.uuid4().hex}=="
+    yield (
+        f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n'
+        "MIME-Version: 1.0\r\n"
+        f"From: {formataddr((sender_name, sender_addr), charset='utf-8')}\r\n"
+        f"To: {to_email}\r\n"
+        f"Subject: {Header(subject, 'utf-8').encode()}\r\n"
+        "\r\n"
+        f"--{boundary}\r\n"
+        'Content-Type: text/html; charset="utf-8"\r\n'
+        "MIME-Version: 1.0\r\n"
+        "Content-Transfer-Encoding: base64\r\n"
+        "\r\n"
+    ).encode("ascii")
+    yield _b64_lines(html.encode("utf-8") if isinstance(html, str) else html)
+
+    if attachment is not None:
+        yield f"\r\n--{boundary}\r\n".encode("ascii")
+        wire = attachment.wire
+        for start in range(0, len(wire), chunk_size):
+            yield wire[start:start + chunk_size]
+
+    yield f"\r\n--{boundary}--\r\n".encode("ascii")
@@ -0,0 +1,215 @@
+# quote.py
+# Income protection quote maths, shared by the chat flow and back-office jobs
+#   QuoteEngine.quote()       : one lead (chat path, pure Python)
+#   QuoteEngine.quote_batch() : arrays of ages/incomes (NumPy, vectorised)
+#   current_engine()          : engine compiled from rates.json, hot-reloaded
+# NumPy is only imported by the batch API, so the web app does not need it.
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# -----------------------------
+# Rate table file
+# -----------------------------
+RATE_TABLE_PATH = os.environ.get("SGSH_RATE_TABLE", "rates.json")
+RELOAD_CHECK_INTERVAL = 5         # seconds between rate file mtime checks
+
+# -----------------------------
+# Built-in pricing (used when no rate table file exists)
+# -----------------------------
+AGE_BANDS = (30, 40, 50)          # inclusive upper age of each band
+BAND_RATES = (6, 8, 10, 12)       # RM per RM1,000 coverage; last rate is for age > 50
+COVERAGE_MULTIPLIER = 10          # coverage = income x multiplier ...
+COVERAGE_FLOOR = 300000           # ... but never below this
+COVERAGE_END_AGE = 60             # coverage runs until this age
+
+class QuoteEngine:
+    """
+    Prices income protection from age and annual income.
+    Pass different bands/rates/limits to run what-if scenarios.
+    """
+
+    def __init__(self, age_bands=AGE_BANDS, rates=BAND_RATES,
+                 multiplier=COVERAGE_MULTIPLIER, floor=COVERAGE_FLOOR,
+                 end_age=COVERAGE_END_AGE, version="builtin"):
+        if len(rates) != len(age_bands) + 1:
+            raise ValueError("rates needs exactly one entry more than age_bands")
+        if list(age_bands) != sorted(set(age_bands)):
+            raise ValueError("age_bands must be strictly increasing")
+        self.age_bands = tuple(age_bands)
+        self.rates = tuple(rates)
+        self.multiplier = multiplier
+        self.floor = floor
+        self.end_age = end_age
+        self.version = version
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        Compile a rate table (see rates.json) into an engine. Bands may be
+        listed in any order; exactly one band must have "max_age": null.
+        """
+        bands = table["age_bands"]
+        open_ended = [b for b in bands if b.get("max_age") is None]
+        if len(open_ended) != 1:
+            raise ValueError("rate table needs exactly one band without max_age")
+        bounded = sorted((b for b in bands if b.get("max_age") is not None),
+                         key=lambda b: b["max_age"])
+        return cls(
+            age_bands=[int(b["max_age"]) for b in bounded],
+            rates=[b["rate"] for b in bounded] + [open_ended[0]["rate"]],
+            multiplier=table.get("coverage_multiplier", COVERAGE_MULTIPLIER),
+            floor=table.get("coverage_floor", COVERAGE_FLOOR),
+            end_age=table.get("coverage_end_age", COVERAGE_END_AGE),
+            version=str(table["version"]),
+        )
+
+    # -----------------------------
+    # Scalar API
+    # -----------------------------
+    def rate_for(self, age):
+        # bisect_left: an age equal to a band's upper bound stays in that band
+        return self.rates[bisect_left(self.age_bands, age)]
+
+    def quote(self, age, income):
+        """Return the quote for one lead as a dict."""
+        recommended_coverage = max(income * self.multiplier, self.floor)
+        rate = self.rate_for(age)
+        annual_premium = (recommended_coverage / 1000) * rate
+        return {
+            "years_coverage": max(self.end_age - age, 0),
+            "recommended_coverage": recommended_coverage,
+            "rate": rate,
+            "annual_premium": annual_premium,
+            "monthly_premium": annual_premium / 12,
+            "table_version": self.version,
+        }
+
+    # -----------------------------
+    # Vectorised API
+    # -----------------------------
+    def quote_batch(self, ages, incomes):
+        """
+        Price many leads at once. `ages` and `incomes` are array-likes of equal
+        length; returns a dict of NumPy arrays with the same keys as quote().
+        """
+        import numpy as np
+
+        ages = np.asarray(ages, dtype=np.int64)
+        incomes = np.asarray(incomes, dtype=np.float64)
+        if ages.shape != incomes.shape:
+            raise ValueError("ages and incomes must have the same shape")
+
+        recommended_coverage = np.maximum(incomes * self.multiplier, self.floor)
+        # side="left": an age equal to a band's upper bound stays in that band
+        band = np.searchsorted(np.asarray(self.age_bands), ages, side="left")
+        rate = np.asarray(self.rates, dtype=np.float64)[band]
+        annual_premium = (recommended_coverage / 1000) * rate
+        return {
+            "years_coverage": np.maximum(self.end_age - ages, 0),
+            "recommended_coverage": recommended_coverage,
+            "rate": rate,
+            "annual_premium": annual_premium,
+            "monthly_premium": annual_premium / 12,
+            "table_version": self.version,
+        }
+
+# -----------------------------
+# Hot-reloaded rate table
+# -----------------------------
+class RateTableLoader:
+    """
+    Holds the engine compiled from a rate table file and swaps it when the
+    file changes. The swap is a single reference assignment, so requests in
+    flight keep the engine they started with. A broken file is reported and
+    the previous table stays live.
+    """
+
+    def __init__(self, path=RATE_TABLE_PATH, check_interval=RELOAD_CHECK_INTERVAL,
+                 fallback=None):
+        self.path = path
+        self.check_interval = check_interval
+        self._engine = fallback or QuoteEngine()
+        self._stamp = None
+        self._next_check = 0.0
+        self._missing_logged = False
+        self._lock = threading.Lock()
+
+    def engine(self):
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return self._engine
+
+    def reload(self, force=False):
+        """Recompile the table if the file changed. Returns the live engine."""
+        if not self._lock.acquire(blocking=False):
+            return self._engine  # another thread is already reloading
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if not self._missing_logged:
+                    # the path is relative to the working directory unless SGSH_RATE_TABLE is absolute
+                    print(f"[Rates] {os.path.abspath(self.path)} not found, "
+                          f"using rate table {self._engine.version}")
+                    self._missing_logged = True
+                return self._engine
+            self._missing_logged = False
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp and not force:
+                return self._engine
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    engine = QuoteEngine.from_table(json.load(f))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[Rates] Keeping table {self._engine.version}, failed to load {self.path}: {e}")
+                self._stamp = stamp
+                return self._engine
+            self._stamp = stamp
+            if engine.version != self._engine.version:
+                print(f"[Rates] Loaded rate table {engine.version} from {self.path}")
+            self._engine = engine
+            return engine
+        finally:
+            self._lock.release()
+
+_loader = RateTableLoader()
+
+def current_engine():
+    """Engine for the live rate table (checks the file every few seconds)."""
+    return _loader.engine()
+
+# -----------------------------
+# Helpers for Campaign1 records
+# -----------------------------
+def parse_amount(value):
+    """'RM 84,000.00' / '84000' / 84000 -> 84000.0; None if unreadable."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = str(value).upper().replace("RM", "").replace(",", "").strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+def reprice_records(records, engine=None):
+    """
+    Re-price rows from `worksheet.get_all_records()` (Age / Income columns).
+    Rows without a usable age or income are skipped; returns (row_numbers, quotes)
+    where row_numbers are the sheet rows that were priced.
+    """
+    engine = engine or current_engine()
+    row_numbers, ages, incomes = [], [], []
+    for row_number, record in enumerate(records, start=2):  # Row 2 = first data row
+        age = parse_amount(record.get("Age", ""))
+        income = parse_amount(record.get("Income", ""))
+        if age is None or income is None:
+            continue
+        row_numbers.append(row_number)
+        ages.append(int(age))
+        incomes.append(income)
+    return row_numbers, engine.quote_batch(ages, incomes)
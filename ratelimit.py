@@ -0,0 +1,110 @@
+# ratelimit.py
+# Thread-safe token-bucket rate limiter
+# `rate` tokens are added per second up to `capacity`; acquire() blocks until
+# enough tokens are available, so short bursts pass straight through and a
+# sustained load is smoothed to `rate` per second. SharedTokenBucket keeps
+# the bucket in SQLite so several worker processes share one quota.
+
+import sqlite3
+import threading
+import time
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take `tokens` if available now. Returns 0 on success, else seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` are taken. Returns False if `timeout` runs out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose level lives in SQLite, so every thread and process
+    using the same `path` and `name` draws from one bucket. Each attempt is
+    one short BEGIN IMMEDIATE transaction; time is wall-clock so processes
+    agree on it.
+    """
+
+    def __init__(self, name, rate, capacity=None, path="ratelimit.db"):
+        super().__init__(rate, capacity)
+        self.name = name
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets"
+            " (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")   # losing a few tokens on a crash is fine
+            self._local.conn = conn
+        return conn
+
+    def try_acquire(self, tokens=1):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            level = self.capacity
+            if row is not None:
+                level = min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            wait = 0
+            if level >= tokens:
+                level -= tokens
+            else:
+                wait = (tokens - level) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, level, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def level(self):
+        """Tokens currently available (approximate, for reporting)."""
+        row = self._conn().execute(
+            "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is None:
+            return self.capacity
+        return min(self.capacity, row[0] + max(0.0, time.time() - row[1]) * self.rate)
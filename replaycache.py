@@ -0,0 +1,60 @@
+# replaycache.py
+# Idempotent /chat: the last reply of each tab, keyed by the client's message id
+# The client sends a fresh `msg_id` with every message and the same one when it
+# retries. A replayed id gets the cached reply back without running the step
+# again, so a double submit or a retry after a timeout cannot save the lead or
+# send the summary email twice.
+# Records live in the state store next to the tab's state (same backend, same
+# idle TTL), so every worker sees them. Requests for one tab are serialised
+# per process; across processes only the stored record is shared.
+
+import threading
+
+MAX_MSG_ID_LENGTH = 64
+STRIPES = 64            # lock stripes; tabs hash onto one of these
+
+def message_id(data):
+    """The request's msg_id as a short string, or None if the client sent none."""
+    msg_id = data.get("msg_id")
+    if msg_id is None or msg_id == "":
+        return None
+    return str(msg_id)[:MAX_MSG_ID_LENGTH]
+
+class ReplayCache:
+
+    def __init__(self, store, stripes=STRIPES):
+        self.store = store
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._lock = threading.Lock()
+        self.stats = {"keyed": 0, "replayed": 0}
+
+    @staticmethod
+    def record_key(key):
+        return f"{key}#last"
+
+    def lock(self, key):
+        """Lock held while one tab's message is looked up, processed and recorded."""
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def lookup(self, key, msg_id):
+        """Cached reply if `msg_id` is the tab's last message id, else None."""
+        record = self.store.get(self.record_key(key))
+        hit = record is not None and record[0] == msg_id
+        with self._lock:
+            self.stats["keyed"] += 1
+            if hit:
+                self.stats["replayed"] += 1
+        return record[1] if hit else None
+
+    def remember(self, key, msg_id, reply):
+        self.store.set(self.record_key(key), [msg_id, reply])
+
+    def forget(self, key):
+        self.store.delete(self.record_key(key))
+
+    def snapshot(self):
+        """This process's counters; suppression_rate = replayed / requests with a msg_id."""
+        with self._lock:
+            report = dict(self.stats)
+        report["suppression_rate"] = round(report["replayed"] / report["keyed"], 4) if report["keyed"] else 0.0
+        return report
@@ -0,0 +1,88 @@
+# rowschema.py
+# Canonical lead fields and the header spellings accepted for each
+# A FieldResolver maps a header layout (tuple of keys) to one column
+# position per field once, caches that plan by header tuple, and then
+# resolves every row with the same layout by direct index access.
+
+MISSING = "—"
+MAX_LAYOUTS = 256           # distinct header tuples cached per resolver
+_NO_MATCH = 1 << 30
+
+# Header spellings accepted for each field, after the field name itself
+FIELD_ALIASES = {
+    "LifeStage": ["Life Stage", "life_stage"],
+    "ProtectionLevel": ["Protection Level", "protection_level"],
+    "MonthlyBudget": ["Monthly Budget", "monthly_budget"],
+    "Whatsapp": ["Whatsapp", "WhatsApp", "wa_link", "WhatsApp Link"],
+    "Name": ["name"],
+    "Income": ["income"],
+    "Phone": ["phone"],
+    "Dependents": ["dependents"],
+    "Email": ["email", "Email Address"],
+    "EmailSent": ["Email_sent", "Email Sent", "EmailSentTimestamp", "Email_sent_timestamp"],
+    "Age": ["age"]
+}
+
+def norm(key):
+    return str(key).lower().replace(" ", "").replace("_", "")
+
+class FieldResolver:
+    """
+    Resolves `fields` in a row with the same precedence the old Emailservice.v
+    had: the exact key if it has a value, then the first key equal to the
+    field ignoring case/spaces/underscores, then each alias in order.
+    Missing or empty values come back as "—"; everything else as str.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._candidates = {}   # normalised key -> [(field index, priority)]
+        for idx, field in enumerate(self.fields):
+            seen = set()
+            for prio, name in enumerate([field] + FIELD_ALIASES.get(field, [])):
+                n = norm(name)
+                if n not in seen:
+                    seen.add(n)
+                    self._candidates.setdefault(n, []).append((idx, prio))
+        self._plans = {}
+
+    def plan(self, keys):
+        """((exact position, fallback position), ...) per field for header tuple `keys`."""
+        plan = self._plans.get(keys)
+        if plan is None:
+            plan = self._compile(keys)
+            if len(self._plans) < MAX_LAYOUTS:
+                self._plans[keys] = plan
+        return plan
+
+    def _compile(self, keys):
+        n = len(self.fields)
+        exact = [None] * n
+        fallback = [None] * n
+        rank = [_NO_MATCH] * n
+        for pos, key in enumerate(keys):
+            for idx, prio in self._candidates.get(norm(key), ()):
+                if exact[idx] is None and key == self.fields[idx]:
+                    exact[idx] = pos
+                if prio < rank[idx]:
+                    rank[idx] = prio
+                    fallback[idx] = pos
+        return tuple(zip(exact, fallback))
+
+    def resolve_values(self, keys, values):
+        """Field vector for one row given as header tuple + aligned values."""
+        if len(values) < len(keys):     # sheet rows come back ragged
+            values = list(values) + [""] * (len(keys) - len(values))
+        out = []
+        for exact, fallback in self.plan(keys):
+            val = values[exact] if exact is not None else None
+            if not val and fallback is not None:
+                val = values[fallback]
+            out.append(str(val) if val else MISSING)
+        return out
+
+    def __call__(self, row):
+        """Field vector for a dict row (get_all_records / session row_dict)."""
+        if not row:
+            return [MISSING] * len(self.fields)
+        return self.resolve_values(tuple(row), tuple(row.values()))
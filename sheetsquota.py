@@ -0,0 +1,175 @@
+# sheetsquota.py
+# One scheduler for every Google Sheets API call
+# Reads and writes each draw from a token bucket sized to the Sheets quota
+# (per user: 60 read + 60 write requests/minute by default). The buckets live
+# in SQLite, so all threads and all worker processes on the host share them.
+# 429 and 5xx responses (and dropped connections) are retried with jittered
+# exponential backoff instead of being lost. Writes are only retried when the
+# server provably did not apply them (429, or the connection never opened): a
+# timed-out append_rows may already have landed, and appending it again would
+# duplicate the rows and shift SheetWriter's row numbers.
+
+import functools
+import os
+import random
+import threading
+import time
+
+from ratelimit import SharedTokenBucket
+
+# -----------------------------
+# Config
+# -----------------------------
+READS_PER_MINUTE = int(os.environ.get("SGSH_SHEETS_READS_PER_MIN", 60))
+WRITES_PER_MINUTE = int(os.environ.get("SGSH_SHEETS_WRITES_PER_MIN", 60))
+BURST = int(os.environ.get("SGSH_SHEETS_BURST", 10))
+QUOTA_PATH = os.environ.get("SGSH_QUOTA_PATH", "sheets_quota.db")
+MAX_RETRIES = 7
+BACKOFF_BASE = 1.0          # seconds; attempt n sleeps uniform(0, base * 2**n)
+BACKOFF_CAP = 64.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# gspread Worksheet methods by quota bucket; anything else passes through
+READ_METHODS = frozenset({
+    "get", "batch_get", "get_values", "get_all_values", "get_all_records",
+    "row_values", "col_values", "cell", "acell", "find", "findall",
+})
+WRITE_METHODS = frozenset({
+    "update", "batch_update", "update_cell", "update_cells", "update_acell",
+    "append_row", "append_rows", "insert_row", "insert_rows", "delete_rows",
+    "add_rows", "resize", "clear", "batch_clear", "format",
+})
+
+def api_status(e):
+    """HTTP status of a gspread APIError (None for other exceptions)."""
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+def never_sent(e):
+    """True if the request failed before reaching the server (refused, DNS, connect timeout)."""
+    if isinstance(e, ConnectionRefusedError):
+        return True
+    import requests
+    import urllib3
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        # requests wraps urllib3's MaxRetryError; its reason says which phase failed
+        reason = getattr(e.args[0], "reason", None)
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+def is_retryable(e, kind="read"):
+    status = api_status(e)
+    if kind == "write":
+        return status == 429 or never_sent(e)
+    if status in RETRY_STATUSES:
+        return True
+    # dropped connections / timeouts (requests' exceptions are OSErrors too)
+    return isinstance(e, OSError)
+
+def retry_after(e):
+    """Seconds from a Retry-After header, if the server sent one."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+class SheetsScheduler:
+
+    def __init__(self, reads_per_minute=READS_PER_MINUTE, writes_per_minute=WRITES_PER_MINUTE,
+                 burst=BURST, path=QUOTA_PATH):
+        self.buckets = {
+            "read": SharedTokenBucket("sheets.read", reads_per_minute / 60, burst, path),
+            "write": SharedTokenBucket("sheets.write", writes_per_minute / 60, burst, path),
+        }
+        self._lock = threading.Lock()
+        self._queued = {"read": 0, "write": 0}
+        self._in_flight = 0
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failed": 0}
+
+    def _bump(self, counter, key, delta=1):
+        with self._lock:
+            counter[key] += delta
+
+    def call(self, kind, fn, *args, **kwargs):
+        """Run one API call under the `kind` ("read"/"write") quota, retrying transient errors."""
+        bucket = self.buckets[kind]
+        attempt = 0
+        while True:
+            self._bump(self._queued, kind)
+            try:
+                bucket.acquire()
+            finally:
+                self._bump(self._queued, kind, -1)
+
+            with self._lock:
+                self._in_flight += 1
+                self.stats["calls"] += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e, kind) or attempt >= MAX_RETRIES:
+                    self._bump(self.stats, "failed")
+                    raise
+                status = api_status(e)
+                if status == 429:
+                    self._bump(self.stats, "throttled")
+                self._bump(self.stats, "retries")
+                delay = max(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)),
+                            retry_after(e))
+                name = getattr(fn, "__name__", "call")
+                print(f"[Sheets] {name} got {status or type(e).__name__}, "
+                      f"retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                attempt += 1
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+            time.sleep(delay)
+
+    def queue_depth(self):
+        """Calls waiting for a token in this process, per bucket."""
+        with self._lock:
+            return dict(self._queued)
+
+    def snapshot(self):
+        with self._lock:
+            report = {"queued": dict(self._queued), "in_flight": self._in_flight, **self.stats}
+        report["tokens"] = {kind: round(b.level(), 2) for kind, b in self.buckets.items()}
+        return report
+
+class ScheduledWorksheet:
+    """A gspread Worksheet whose API methods all go through a SheetsScheduler."""
+
+    def __init__(self, worksheet, scheduler):
+        self._worksheet = worksheet
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name in READ_METHODS:
+            return functools.partial(self._scheduler.call, "read", attr)
+        if name in WRITE_METHODS:
+            return functools.partial(self._scheduler.call, "write", attr)
+        return attr
+
+    def __repr__(self):
+        return f"<ScheduledWorksheet {self._worksheet!r}>"
+
+_scheduler = None
+_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = SheetsScheduler()
+        return _scheduler
+
+def sheets_call(kind, fn, *args, **kwargs):
+    """Shorthand for get_scheduler().call(...) for calls outside a worksheet."""
+    return get_scheduler().call(kind, fn, *args, **kwargs)
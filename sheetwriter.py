@@ -0,0 +1,93 @@
+# sheetwriter.py
+# Buffered row writer for Google Sheets
+# Rows from concurrent callers are collected and written with one
+# append_rows call once `max_rows` are pending or the oldest row has waited
+# `max_delay_ms`, whichever comes first. Each caller gets a Future that
+# resolves to the sheet row number its row landed on.
+
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+# -----------------------------
+# Config
+# -----------------------------
+MAX_ROWS = 50
+MAX_DELAY_MS = 500
+
+# "Campaign1!A10:M12" -> 10
+_UPDATED_RANGE_RE = re.compile(r"![A-Za-z]*(\d+)")
+
+def first_row_of(response):
+    """Row number of the first row written by a values.append response."""
+    updated_range = response["updates"]["updatedRange"]
+    m = _UPDATED_RANGE_RE.search(updated_range)
+    if m is None:
+        raise ValueError(f"Unexpected updatedRange: {updated_range}")
+    return int(m.group(1))
+
+class SheetWriter:
+    """
+    `get_sheet` is a zero-argument callable returning the gspread Worksheet,
+    so the writer always uses the current (possibly re-opened) handle.
+    """
+
+    def __init__(self, get_sheet, max_rows=MAX_ROWS, max_delay_ms=MAX_DELAY_MS):
+        self.get_sheet = get_sheet
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._pending = []              # (row, future, enqueued_at)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, row):
+        """Queue one row. Returns a Future resolving to its 1-based row number."""
+        future = Future()
+        with self._cond:
+            self._pending.append((row, future, time.monotonic()))
+            if len(self._pending) >= self.max_rows:
+                self._cond.notify()
+            elif len(self._pending) == 1:
+                self._cond.notify()     # start the delay timer
+        return future
+
+    def flush(self):
+        """Write everything pending now (blocks until done)."""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0][2] + self.max_delay
+                while len(self._pending) < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_rows]
+                del self._pending[:self.max_rows]
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            response = self.get_sheet().append_rows(
+                [row for row, _, _ in batch],
+                value_input_option="RAW",
+                insert_data_option="INSERT_ROWS",
+                table_range="A1",
+            )
+            first = first_row_of(response)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for offset, (_, future, _) in enumerate(batch):
+            future.set_result(first + offset)
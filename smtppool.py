@@ -0,0 +1,262 @@
+# smtppool.py
+# Thread-safe pool of persistent, authenticated SMTP connections
+# A connection is reused across messages (one DATA transaction per email
+# instead of connect + STARTTLS + login), checked with NOOP after sitting
+# idle, replaced when the server drops it and retired after `max_messages`.
+
+import copy
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+# -----------------------------
+# Defaults
+# -----------------------------
+POOL_SIZE = 4
+MAX_MESSAGES_PER_CONNECTION = 100
+IDLE_CHECK_SECONDS = 30         # NOOP before reusing a connection idle this long
+CONNECT_TIMEOUT = 30
+
+class SMTPReplyLost(smtplib.SMTPException):
+    """
+    The whole message, terminator included, was sent but the connection
+    dropped before the server answered: it may have been accepted, so it
+    must not be sent again.
+    """
+
+class _PooledConnection:
+    __slots__ = ("smtp", "sent", "last_used")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+class SMTPPool:
+    """
+    `starttls` / `username` can be turned off to talk to a plain local SMTP
+    stand-in (e.g. in development or tests).
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 size=POOL_SIZE, max_messages=MAX_MESSAGES_PER_CONNECTION,
+                 idle_check=IDLE_CHECK_SECONDS, timeout=CONNECT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self._idle = []             # most recently used last
+        self._open = 0              # idle + checked out
+        self._closed = False
+        self._cond = threading.Condition()
+
+    # -----------------------------
+    # Connection lifecycle
+    # -----------------------------
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            _close_quietly(smtp)
+            raise
+        return _PooledConnection(smtp)
+
+    def _healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.idle_check:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn = None
+                    break
+                self._cond.wait()
+
+        if conn is not None:
+            if self._healthy(conn):
+                return conn
+            _close_quietly(conn.smtp)
+        try:
+            return self._connect()
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _release(self, conn):
+        conn.last_used = time.monotonic()
+        if conn.sent >= self.max_messages or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        if conn is not None:
+            _close_quietly(conn.smtp)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out one smtplib.SMTP. A connection that raises is not reused."""
+        conn = self._acquire()
+        try:
+            yield conn.smtp
+        except BaseException:
+            self._discard(conn)
+            raise
+        conn.sent += 1
+        self._release(conn)
+
+    def prime(self, count=1):
+        """Open up to `count` idle connections ahead of the first send."""
+        opened = 0
+        for _ in range(count):
+            with self._cond:
+                if self._closed or self._open >= self.size:
+                    break
+                self._open += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                self._discard(None)
+                raise
+            self._release(conn)
+            opened += 1
+        return opened
+
+    # -----------------------------
+    # Sending
+    # -----------------------------
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """
+        Send an email.message.Message on a pooled connection. If the connection
+        drops before the message is complete, retry once on a fresh one; a
+        reply lost after that raises SMTPReplyLost and is not retried.
+        """
+        from email.utils import getaddresses
+        if from_addr is None:
+            from_addr = getaddresses([msg["Sender"] or msg["From"]])[0][1]
+        if to_addrs is None:
+            fields = msg.get_all("To", []) + msg.get_all("Cc", []) + msg.get_all("Bcc", [])
+            to_addrs = [addr for _, addr in getaddresses(fields)]
+        if msg["Bcc"] is not None:
+            msg = copy.deepcopy(msg)
+            del msg["Bcc"]
+        data = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+        try:
+            return self.send_stream(from_addr, to_addrs, [data])
+        except smtplib.SMTPServerDisconnected:
+            return self.send_stream(from_addr, to_addrs, [data])
+
+    def send_stream(self, from_addr, to_addrs, chunks):
+        """
+        Send a message given as an iterable of bytes chunks (CRLF line endings),
+        writing each chunk to the DATA stream as it is produced, so the whole
+        message never has to exist in memory at once. Not retried here since
+        `chunks` may be a one-shot generator; a caller that can rebuild it
+        retries on SMTPServerDisconnected, which is only raised while the
+        server cannot have the message yet (see Emailservice.send_email).
+        """
+        with self.connection() as smtp:
+            return stream_data(smtp, from_addr, to_addrs, chunks)
+
+    def close(self):
+        """Close every idle connection (checked-out ones close on release)."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            _close_quietly(conn.smtp)
+
+# -----------------------------
+# Streaming DATA
+# -----------------------------
+def _dot_stuff(chunk, at_line_start):
+    """Double any '.' that starts a line (RFC 5321 4.5.2); copies only when needed."""
+    if at_line_start and chunk[:1] == b".":
+        chunk = b"." + chunk
+    if b"\n." in chunk:
+        chunk = chunk.replace(b"\n.", b"\n..")
+    return chunk
+
+def _check_closing(smtp, code, resp):
+    # 421: the server is closing the connection (e.g. Gmail's idle timeout),
+    # so treat it like a drop and let the caller retry on a fresh connection
+    if code == 421:
+        smtp.close()
+        raise smtplib.SMTPServerDisconnected(f"Server closed the connection: {code} {resp!r}")
+
+def stream_data(smtp, from_addr, to_addrs, chunks):
+    """
+    MAIL FROM / RCPT TO / DATA on an open smtplib.SMTP, streaming `chunks`.
+    A drop before the final "." raises SMTPServerDisconnected (safe to
+    retry); a drop while waiting for the reply to it raises SMTPReplyLost.
+    """
+    smtp.ehlo_or_helo_if_needed()
+    code, resp = smtp.mail(from_addr)
+    _check_closing(smtp, code, resp)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+    for to_addr in to_addrs:
+        code, resp = smtp.rcpt(to_addr)
+        _check_closing(smtp, code, resp)
+        if code not in (250, 251):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused({to_addr: (code, resp)})
+
+    code, resp = smtp.docmd("data")
+    _check_closing(smtp, code, resp)
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+    at_line_start = True
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            smtp.sock.sendall(_dot_stuff(chunk, at_line_start))
+            at_line_start = chunk[-1:] == b"\n"
+        smtp.sock.sendall(b".\r\n" if at_line_start else b"\r\n.\r\n")
+    except OSError as e:
+        smtp.close()
+        raise smtplib.SMTPServerDisconnected(f"Connection lost during DATA: {e}")
+
+    try:
+        code, resp = smtp.getreply()
+    except smtplib.SMTPServerDisconnected as e:
+        raise SMTPReplyLost(f"No reply after the end of DATA: {e}") from e
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+    return code, resp
+
+def _close_quietly(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
@@ -0,0 +1,228 @@
+# spool.py
+# Durable write-behind queue for completed chatbot sessions
+# /chat enqueues the lead into a local SQLite (WAL) file and replies at once;
+# background workers drain the spool into Google Sheets + email.
+# Jobs are leased while they run, so a job held by a crashed process is
+# picked up again once its lease expires (including after a restart). The
+# lease is renewed while the job runs and carries a token, so a slow job is
+# not handed to a second worker and a worker that lost its lease cannot
+# complete or fail the job another one now holds.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# -----------------------------
+# Config
+# -----------------------------
+SPOOL_PATH = os.environ.get("SGSH_SPOOL_PATH", "lead_spool.db")
+SPOOL_WORKERS = int(os.environ.get("SGSH_SPOOL_WORKERS", 8))
+LEASE_SECONDS = 300         # a running job is considered abandoned after this
+RENEW_INTERVAL = LEASE_SECONDS / 3      # running jobs extend their lease this often
+POLL_INTERVAL = 2.0         # idle workers re-check the spool this often
+MAX_ATTEMPTS = 8            # after this a job is parked as 'failed'
+MAX_BACKOFF = 600           # seconds
+
+class LeadSpool:
+    """SQLite-backed job queue. Safe to share between threads and worker processes."""
+
+    def __init__(self, path=SPOOL_PATH):
+        self.path = path
+        self.wakeup = threading.Event()
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"   # pending / running / failed
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " not_before REAL NOT NULL DEFAULT 0,"
+            " lease_until REAL NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL,"
+            " last_error TEXT)"
+        )
+        columns = [c[1] for c in self._conn().execute("PRAGMA table_info(jobs)")]
+        if "lease_token" not in columns:
+            # spools created before leases carried a token
+            try:
+                self._conn().execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+            except sqlite3.OperationalError:
+                pass        # another worker process added it first
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")   # a queued lead must survive a crash
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload):
+        """Persist one job and wake a worker. Returns the job id."""
+        cur = self._conn().execute(
+            "INSERT INTO jobs (payload, created) VALUES (?, ?)",
+            (json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        self.wakeup.set()
+        return cur.lastrowid
+
+    def claim(self):
+        """Lease the oldest runnable job. Returns (job_id, payload, lease_token) or None."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload FROM jobs"
+                " WHERE (status = 'pending' AND not_before <= ?)"
+                "    OR (status = 'running' AND lease_until <= ?)"
+                " ORDER BY id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', lease_until = ?, lease_token = ?,"
+                    " attempts = attempts + 1 WHERE id = ?",
+                    (now + LEASE_SECONDS, token, row[0]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), token
+
+    def renew(self, job_id, token):
+        """Extend a running job's lease. False if `token` no longer holds it."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND lease_token = ?",
+            (time.time() + LEASE_SECONDS, job_id, token),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id, token):
+        """Delete a finished job, unless its lease has passed to another worker."""
+        cur = self._conn().execute(
+            "DELETE FROM jobs WHERE id = ? AND lease_token = ?", (job_id, token)
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id, token, error):
+        """Release a job for a later retry with exponential backoff, or park it."""
+        conn = self._conn()
+        found = conn.execute(
+            "SELECT attempts FROM jobs WHERE id = ? AND lease_token = ?", (job_id, token)
+        ).fetchone()
+        if found is None:
+            return False    # the lease passed to another worker, which now owns the job
+        (attempts,) = found
+        if attempts >= MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = ? WHERE id = ? AND lease_token = ?",
+                (str(error), job_id, token),
+            )
+            return True
+        delay = min(5 * 2 ** (attempts - 1), MAX_BACKOFF)
+        conn.execute(
+            "UPDATE jobs SET status = 'pending', not_before = ?, last_error = ?"
+            " WHERE id = ? AND lease_token = ?",
+            (time.time() + delay, str(error), job_id, token),
+        )
+        return True
+
+    def pending_count(self):
+        (count,) = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status != 'failed'"
+        ).fetchone()
+        return count
+
+# -----------------------------
+# Workers
+# -----------------------------
+def write_lead(payload):
+    # import locally to avoid import-time side-effects (Google credentials)
+    from googlesheet import write_session
+    write_session(
+        payload["session_data"],
+        email_sent=payload.get("email_sent", False),
+        lead_id=payload.get("lead_id"),
+    )
+
+def _keep_leased(spool, job_id, token, done):
+    while not done.wait(RENEW_INTERVAL):
+        try:
+            if not spool.renew(job_id, token):
+                print(f"[Spool] Job {job_id} lease lost to another worker")
+                return
+        except sqlite3.Error as e:
+            print(f"[Spool] Lease renewal for job {job_id} failed: {e}")
+
+def _worker_loop(spool, handler):
+    while True:
+        try:
+            job = spool.claim()
+        except sqlite3.Error as e:
+            print(f"[Spool] Claim failed: {e}")
+            job = None
+        if job is None:
+            spool.wakeup.wait(POLL_INTERVAL)
+            spool.wakeup.clear()
+            continue
+
+        job_id, payload, token = job
+        done = threading.Event()
+        threading.Thread(
+            target=_keep_leased, args=(spool, job_id, token, done),
+            name=f"spool-lease-{job_id}", daemon=True,
+        ).start()
+        try:
+            handler(payload)
+        except Exception as e:
+            print(f"[Spool] Job {job_id} failed: {e}")
+            spool.fail(job_id, token, e)
+        else:
+            spool.complete(job_id, token)
+        finally:
+            done.set()
+
+_spool = None
+_workers = []
+_lock = threading.Lock()
+
+def get_spool():
+    global _spool
+    with _lock:
+        if _spool is None:
+            _spool = LeadSpool()
+        return _spool
+
+def start_workers(count=SPOOL_WORKERS, handler=write_lead):
+    """Start the drain threads once per process. Jobs left by earlier runs are replayed."""
+    spool = get_spool()
+    with _lock:
+        if _workers:
+            return
+        for i in range(count):
+            t = threading.Thread(
+                target=_worker_loop, args=(spool, handler),
+                name=f"spool-worker-{i}", daemon=True,
+            )
+            t.start()
+            _workers.append(t)
+
+def enqueue_lead(session_data, email_sent=False):
+    """Queue a completed session for saving. Returns the lead id."""
+    start_workers()
+    lead_id = uuid.uuid4().hex
+    get_spool().enqueue({
+        "session_data": dict(session_data),
+        "email_sent": email_sent,
+        "lead_id": lead_id,
+    })
+    return lead_id
@@ -0,0 +1,206 @@
+# statestore.py
+# Server-side storage for per-tab chatbot conversation state
+# The Flask session cookie only carries an opaque session id; the state lives here
+# Backends: in-process LRU (default), SQLite, Redis protocol
+# The SQLite and Redis stores write values as JSON, except strings starting
+# with VERBATIM_PREFIX, which are stored and returned as they are (the packed
+# chat state, see chatstate.pack_text). `serialises` tells callers which kind
+# of store they have.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# -----------------------------
+# Config
+# -----------------------------
+DEFAULT_TTL = 30 * 60          # seconds a tab may sit idle before eviction
+DEFAULT_MAX_ENTRIES = 10000    # LRU cap for the in-process store
+VERBATIM_PREFIX = "\x1e"       # never the first character of JSON text
+
+def dumps(value):
+    if value.__class__ is str and value[:1] == VERBATIM_PREFIX:
+        return value
+    return json.dumps(value, separators=(",", ":"))
+
+def loads(raw):
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    if raw[:1] == VERBATIM_PREFIX:
+        return raw
+    return json.loads(raw)
+
+# -----------------------------
+# In-process LRU store
+# -----------------------------
+class MemoryStateStore:
+    """LRU dict with a sliding idle TTL. Only valid for a single worker process."""
+    serialises = False      # values are kept as the objects passed in
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()   # key -> (expires_at, state), oldest first
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Entries are kept in last-access order and share one TTL,
+        # so expired entries are always at the front.
+        data = self._data
+        while data:
+            key, (expires, _) = next(iter(data.items()))
+            if expires > now and len(data) <= self.max_entries:
+                break
+            data.popitem(last=False)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._data[key]
+                return None
+            self._data[key] = (now + self.ttl, entry[1])
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, state):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (now + self.ttl, state)
+            self._data.move_to_end(key)
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+# -----------------------------
+# SQLite store
+# -----------------------------
+class SQLiteStateStore:
+    """Shared by every worker on one host. Expired rows are purged every `purge_every` writes."""
+    serialises = True
+
+    def __init__(self, path="chatbot_states.db", ttl=DEFAULT_TTL, purge_every=500):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS states ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS states_expires ON states (expires)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM states WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE states SET expires = ? WHERE key = ?", (now + self.ttl, key))
+        return loads(row[0])
+
+    def set(self, key, state):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO states (key, value, expires) VALUES (?, ?, ?)",
+            (key, dumps(state), now + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge(now)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM states WHERE key = ?", (key,))
+
+    def purge(self, now=None):
+        """Delete every expired row. Returns the number of rows removed."""
+        cur = self._conn().execute(
+            "DELETE FROM states WHERE expires <= ?", (now or time.time(),)
+        )
+        return cur.rowcount
+
+# -----------------------------
+# Redis-protocol store
+# -----------------------------
+class RedisStateStore:
+    """
+    Uses native key expiry for the TTL. `client` may be any object with the
+    redis-py interface (e.g. a fakeredis instance or a local stand-in server).
+    """
+    serialises = True
+
+    def __init__(self, url="redis://localhost:6379/0", ttl=DEFAULT_TTL,
+                 client=None, prefix="sgsh:state:"):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        # GET + EXPIRE in a single round trip to slide the idle TTL
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.prefix + key)
+        pipe.expire(self.prefix + key, self.ttl)
+        raw, _ = pipe.execute()
+        return loads(raw) if raw is not None else None
+
+    def set(self, key, state):
+        self.client.set(self.prefix + key, dumps(state), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+# -----------------------------
+# Factory
+# -----------------------------
+def create_state_store(spec=None, ttl=None):
+    """
+    Build a store from a spec string (default: $SGSH_STATE_STORE or "memory"):
+      memory
+      sqlite:///path/to/states.db
+      redis://host:6379/0
+    """
+    spec = spec or os.environ.get("SGSH_STATE_STORE", "memory")
+    if ttl is None:
+        ttl = int(os.environ.get("SGSH_STATE_TTL", DEFAULT_TTL))
+
+    if spec == "memory":
+        return MemoryStateStore(ttl=ttl)
+    if spec.startswith("sqlite:"):
+        if spec.startswith("sqlite:///"):
+            path = spec[len("sqlite:///"):]
+        else:
+            path = spec[len("sqlite:"):]
+        return SQLiteStateStore(path or "chatbot_states.db", ttl=ttl)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(spec, ttl=ttl)
+    raise ValueError(f"Unknown state store: {spec}")
@@ -285,6 +285,28 @@
         return id;
     }
 
+    // One id per message; a retry resends the same id so the server answers
+    // it from cache instead of running the step (and saving/emailing) again
+    function newMessageId(){
+        if(window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return 'msg_' + Date.now() + '_' + Math.random().toString(36).slice(2,11);
+    }
+
+    function postChat(body, retries){
+        return fetch('/chat', {
+            method: 'POST',
+            headers: {'Content-Type':'application/json'},
+            body: JSON.stringify(body)
+        }).then(r=>{
+            if(r.status >= 500) throw new Error('server error ' + r.status);
+            return r.json();
+        }).catch(err=>{
+            if(retries <= 0) throw err;
+            return new Promise(resolve=> setTimeout(resolve, 1000))
+                .then(()=> postChat(body, retries - 1));
+        });
+    }
+
     // -----------------------
     // Send message to server
     // -----------------------
@@ -292,11 +314,7 @@
         setTyping(true);
         lockTyping("Erica is typing...");
 
-        return fetch('/chat', {
-            method: 'POST',
-            headers: {'Content-Type':'application/json'},
-            body: JSON.stringify({message, tab_id: getTabId()})
-        }).then(r=>r.json()).then(data=>{
+        return postChat({message, tab_id: getTabId(), msg_id: newMessageId()}, 2).then(data=>{
             return new Promise(resolve=>{
                 setTimeout(()=>{
                     setTyping(false);
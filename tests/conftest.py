@@ -0,0 +1,228 @@
+# conftest.py
+# Shared set-up for the regression tests
+# Every SQLite file (spool, quota, lead index, watermarks) goes to a scratch
+# directory, warm-up is off and the Sheets quota is raised so the in-memory
+# worksheet below never waits for a token. Google and SMTP are never contacted.
+
+import os
+import re
+import socketserver
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRATCH = tempfile.mkdtemp(prefix="sgsh-tests-")
+
+os.environ.update({
+    "SGSH_WARMUP": "0",
+    "SGSH_STATE_STORE": "memory",
+    "SGSH_RATE_TABLE": os.path.join(ROOT, "rates.json"),
+    "SGSH_SPOOL_PATH": os.path.join(SCRATCH, "lead_spool.db"),
+    "SGSH_QUOTA_PATH": os.path.join(SCRATCH, "sheets_quota.db"),
+    "SGSH_LEAD_INDEX_PATH": os.path.join(SCRATCH, "lead_index.db"),
+    "SGSH_WATERMARK_PATH": os.path.join(SCRATCH, "watermarks.db"),
+    "SGSH_EMAIL_QUOTA_PATH": os.path.join(SCRATCH, "email_quota.db"),
+    "SGSH_SHEETS_READS_PER_MIN": "600000",
+    "SGSH_SHEETS_WRITES_PER_MIN": "600000",
+    "SGSH_SHEETS_BURST": "10000",
+})
+sys.path.insert(0, ROOT)
+
+import pytest
+
+# -----------------------------
+# In-memory stand-in for a gspread Worksheet
+# -----------------------------
+_CELL_RE = re.compile(r"([A-Z]+)(\d*)")
+
+def _col(letters):
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - 64
+    return col
+
+class FakeWorksheet:
+    """The subset of gspread.Worksheet the app uses, with a call log."""
+
+    def __init__(self, rows=None):
+        self.id = 1
+        self.title = "Campaign1"
+        self.rows = [list(r) for r in rows or []]
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _cell(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = value
+
+    def _write(self, range_name, values):
+        letters, row = _CELL_RE.match(range_name).groups()
+        for i, cells in enumerate(values):
+            for j, value in enumerate(cells):
+                self._cell(int(row) + i, _col(letters) + j, value)
+
+    def _read(self, range_name):
+        first, last = range_name.split(":")
+        c1, r1 = _CELL_RE.match(first).groups()
+        c2, r2 = _CELL_RE.match(last).groups()
+        end = int(r2) if r2 else len(self.rows)
+        out = [r[_col(c1) - 1:_col(c2)] for r in self.rows[int(r1) - 1:end]]
+        while out and not any(out[-1]):
+            out.pop()
+        return [r if any(r) else [] for r in out]
+
+    def row_values(self, row):
+        self.calls.append("row_values")
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get(self, range_name, **kwargs):
+        self.calls.append("get")
+        return self._read(range_name)
+
+    def batch_get(self, ranges, **kwargs):
+        self.calls.append("batch_get")
+        return [self._read(r) for r in ranges]
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self.calls.append("update")
+        self._write(range_name, values)
+
+    def update_cell(self, row, col, value):
+        self.calls.append("update_cell")
+        self._cell(row, col, value)
+
+    def batch_update(self, data, **kwargs):
+        self.calls.append("batch_update")
+        for d in data:
+            self._write(d["range"].split(":")[0], d["values"])
+
+    def append_rows(self, rows, **kwargs):
+        self.calls.append("append_rows")
+        with self._lock:
+            start = len(self.rows) + 1
+            self.rows.extend(list(r) for r in rows)
+            return {"updates": {"updatedRange": f"Campaign1!A{start}:N{len(self.rows)}"}}
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def worksheet(self, name):
+        return self._worksheet
+
+class FakeClient:
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def open(self, name):
+        return FakeSpreadsheet(self._worksheet)
+
+@pytest.fixture
+def campaign_sheet(monkeypatch, tmp_path):
+    """
+    A fresh Campaign1 FakeWorksheet wired into googlesheet (client, cached
+    handle, header map, writer and lead index all reset), with its own
+    lead index file. Emails are collected in `campaign_sheet.sent`.
+    """
+    import googleclient
+    import googlesheet
+    import leadindex
+    import Emailservice
+
+    ws = FakeWorksheet([list(googlesheet.HEADERS)])
+    monkeypatch.setattr(googleclient, "_client", FakeClient(ws))
+    monkeypatch.setattr(googlesheet, "_sheet", None)
+    monkeypatch.setattr(googlesheet, "_headers_checked", False)
+    monkeypatch.setattr(googlesheet, "_writer", None)
+    monkeypatch.setattr(googlesheet, "_lead_index", None)
+    googlesheet._header_maps.clear()
+    ws.index_path = str(tmp_path / "lead_index.db")
+    monkeypatch.setattr(googlesheet, "LeadIndex", lambda: leadindex.LeadIndex(ws.index_path))
+
+    ws.sent = []
+    monkeypatch.setattr(Emailservice, "send_email",
+                        lambda to, subject, html, *a, **k: ws.sent.append(to))
+    return ws
+
+# -----------------------------
+# Local SMTP stand-in
+# -----------------------------
+class _SinkHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.connections += 1
+        self.wfile.write(b"220 sink\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.strip().upper()
+            sink.commands.append(cmd.split(b" ")[0].decode())
+            if cmd.startswith(b"EHLO"):
+                self.wfile.write(b"250-sink\r\n250 SIZE 100000000\r\n")
+            elif cmd.startswith(b"MAIL") and sink.take("reply_421_to_mail"):
+                self.wfile.write(b"421 closing\r\n")
+                return
+            elif cmd == b"DATA":
+                self.wfile.write(b"354 go\r\n")
+                if sink.take("drop_in_data"):
+                    self.rfile.readline()
+                    return          # gone before the message was complete
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    lines.append(data_line)
+                sink.messages.append(b"".join(lines))
+                if sink.take("drop_after_data"):
+                    return          # accepted, but the reply never arrives
+                self.wfile.write(b"250 ok\r\n")
+            elif cmd == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Records raw DATA (still dot-stuffed) in `messages`. Set a counter such as
+    `drop_in_data`, `drop_after_data` or `reply_421_to_mail` to misbehave on
+    that many of the next transactions.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.commands = []
+        self.connections = 0
+        self.drop_in_data = self.drop_after_data = self.reply_421_to_mail = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def take(self, knob):
+        with self.lock:
+            if getattr(self, knob):
+                setattr(self, knob, getattr(self, knob) - 1)
+                return True
+        return False
+
+@pytest.fixture
+def smtp_sink():
+    sink = SMTPSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    yield sink
+    sink.shutdown()
+    sink.server_close()
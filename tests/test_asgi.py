@@ -0,0 +1,32 @@
+# test_asgi.py
+# A uvicorn worker started with --workers N runs in a spawned child process
+# and must not keep chat state in its own memory.
+
+import multiprocessing
+import os
+
+def _store_in_child(queue):
+    import asgi
+    import SatuGajiSatuHarapan
+    queue.put((os.environ["SGSH_STATE_STORE"], type(SatuGajiSatuHarapan.state_store).__name__))
+
+def _import_in_child():
+    ctx = multiprocessing.get_context("spawn")      # as uvicorn starts its workers
+    queue = ctx.Queue()
+    child = ctx.Process(target=_store_in_child, args=(queue,))
+    child.start()
+    result = queue.get(timeout=60)
+    child.join(10)
+    return result
+
+def test_worker_process_switches_memory_store_to_sqlite(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SGSH_STATE_STORE", "memory")
+    assert _import_in_child() == ("sqlite:///chat_state.db", "SQLiteStateStore")
+    assert (tmp_path / "chat_state.db").exists()
+
+def test_shared_store_is_left_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    spec = f"sqlite:///{tmp_path}/mine.db"
+    monkeypatch.setenv("SGSH_STATE_STORE", spec)
+    assert _import_in_child() == (spec, "SQLiteStateStore")
@@ -0,0 +1,72 @@
+# test_chatstate.py
+# pack/unpack round trips, including option answers and older state formats,
+# and the text form the SQLite and Redis stores keep verbatim.
+
+import json
+
+import chatstate
+import statestore
+
+FINISHED = {
+    "name": "Ali",
+    "dob": "25/12/1990",
+    "age": 35,
+    "life_stage": chatstate.OPTION_LABELS["life_stage"][0],
+    "dependents": chatstate.OPTION_LABELS["dependents"][1],
+    "protection_level": chatstate.OPTION_LABELS["protection_level"][2],
+    "budget": chatstate.OPTION_LABELS["budget"][3],
+    "phone": "60123456789",
+    "income": 50000,
+    "email": "a@b.com",
+    "rate_table": "2025-01",
+}
+
+def test_round_trip_through_json():
+    state = chatstate.STATE_NAMES[-1]
+    packed = chatstate.pack(state, FINISHED)
+    assert chatstate.unpack(json.loads(json.dumps(packed))) == (state, FINISHED)
+
+def test_option_answers_are_stored_as_indexes():
+    packed = chatstate.pack("start", FINISHED)
+    offset = chatstate.FIELDS.index("budget") + 1
+    assert packed[offset] == 3
+
+def test_fresh_state_is_short():
+    assert chatstate.pack("start", {}) == (chatstate.VERSION, 0)
+    assert chatstate.unpack([chatstate.VERSION, 0]) == ("start", {})
+
+def test_legacy_dict_state_is_accepted():
+    legacy = {"state": chatstate.STATE_NAMES[2], "user_data": {"name": "Ali"}}
+    assert chatstate.unpack(legacy) == (chatstate.STATE_NAMES[2], {"name": "Ali"})
+
+def test_unreadable_state_is_rejected():
+    too_long = [chatstate.VERSION, 0] + [None] * len(chatstate.FIELDS)
+    for data in (None, [], [chatstate.VERSION], [99, 0], [chatstate.VERSION, 999], too_long):
+        assert chatstate.unpack(data) is None
+
+def test_text_round_trip():
+    state = chatstate.STATE_NAMES[-1]
+    text = chatstate.pack_text(state, FINISHED)
+    assert text.startswith(statestore.VERBATIM_PREFIX)
+    assert chatstate.unpack(text) == (state, FINISHED)
+    assert chatstate.unpack(chatstate.pack_text("start", {})) == ("start", {})
+
+def test_text_refuses_values_it_cannot_carry():
+    assert chatstate.pack_text("start", {"name": "a\x1fb"}) is None
+    assert chatstate.pack_text("start", {"income": 1.5}) is None
+    assert chatstate.pack_text("start", {"name": ""}) is None
+
+def test_unreadable_text_is_rejected():
+    head = chatstate.TEXT_HEAD
+    for text in (head, f"{head}\x1f999", f"{head}\x1f0\x1f\x1f\x1fabc", "\x1e9\x1f0"):
+        assert chatstate.unpack(text) is None
+
+def test_sqlite_store_keeps_text_verbatim(tmp_path):
+    store = statestore.SQLiteStateStore(str(tmp_path / "states.db"))
+    text = chatstate.pack_text("start", {"name": "Ali"})
+    store.set("tab", text)
+    row = store._conn().execute("SELECT value FROM states WHERE key = 'tab'").fetchone()
+    assert row[0] == text
+    assert store.get("tab") == text
+    store.set("record", ["m1", "reply"])            # anything else is JSON
+    assert store.get("record") == ["m1", "reply"]
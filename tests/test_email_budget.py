@@ -0,0 +1,69 @@
+# test_email_budget.py
+# Every send, from the chat path or the poller, draws on the shared daily
+# email budget; once it is spent nothing reaches SMTP and rows wait.
+
+import time
+
+import pytest
+
+import Emailservice
+import googlesheet
+from ratelimit import SharedTokenBucket
+from watermark import Watermark
+
+REAL_SEND = Emailservice.send_email
+
+class RecordingPool:
+    def __init__(self):
+        self.recipients = []
+
+    def send_stream(self, sender, recipients, chunks):
+        self.recipients += recipients
+
+@pytest.fixture
+def budget(monkeypatch, tmp_path):
+    """A daily budget of 2 emails that does not refill during the test."""
+    bucket = SharedTokenBucket("email.daily", 1e-9, 2, str(tmp_path / "email_quota.db"))
+    monkeypatch.setattr(Emailservice, "_daily_budget", bucket)
+    return bucket
+
+@pytest.fixture
+def smtp(monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(Emailservice, "get_smtp_pool", lambda: pool)
+    return pool
+
+def test_send_is_refused_once_the_budget_is_spent(budget, smtp):
+    for to in ("a@example.com", "b@example.com"):
+        REAL_SEND(to, "Subject", "<p>hi</p>", attachment_path="missing.pdf")
+    with pytest.raises(Emailservice.DailyLimitReached):
+        REAL_SEND("c@example.com", "Subject", "<p>hi</p>", attachment_path="missing.pdf")
+    assert smtp.recipients == ["a@example.com", "b@example.com"]
+
+def test_budget_is_shared_by_every_process(budget, tmp_path):
+    other = SharedTokenBucket("email.daily", 1e-9, 2, budget.path)
+    assert budget.try_acquire() == 0
+    assert other.try_acquire() == 0
+    assert budget.try_acquire() > 0
+
+def test_chat_path_draws_on_the_budget(campaign_sheet, budget, smtp, monkeypatch):
+    monkeypatch.setattr(Emailservice, "send_email", REAL_SEND)
+    budget.try_acquire(2)
+    googlesheet.write_session({"name": "Ali", "phone": "0123456789", "email": "ali@example.com"})
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.rows[1][12] == ""        # left for the poller
+    assert smtp.recipients == []
+
+def test_poller_sends_no_more_than_the_budget(campaign_sheet, budget, monkeypatch, tmp_path):
+    mark = Watermark("poll", default=1, path=str(tmp_path / "marks.db"))
+    monkeypatch.setattr(Emailservice, "_watermark", mark)
+    saved = time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(time.time() - 3600))
+    for n in range(4):
+        row = [""] * len(googlesheet.HEADERS)
+        row[0], row[9], row[10] = f"Lead {n}", f"lead{n}@example.com", saved
+        campaign_sheet.rows.append(row)
+
+    result = Emailservice.poll_pending_emails()
+    assert result["sent"] == 2
+    assert campaign_sheet.sent == ["lead0@example.com", "lead1@example.com"]
+    assert mark.get() == 3          # rows 4 and 5 are picked up once budget is back
@@ -0,0 +1,174 @@
+# test_lead_dedupe.py
+# Repeat leads (same lower-cased email) update their existing Campaign1 row;
+# leads sharing a canonical phone or email are not re-emailed inside the
+# resend window, including when the first lead was written by another worker
+# process. Rows moved by hand are never overwritten.
+
+import threading
+import time
+
+import googlesheet
+import leadindex
+
+LEAD = {
+    "name": "Ali",
+    "dob": "25/12/1990",
+    "age": 35,
+    "life_stage": "Just married",
+    "dependents": "1 only",
+    "protection_level": "Some personal coverage",
+    "budget": "RM201 - RM500",
+    "income": 50000,
+    "rate_table": "2025-01",
+}
+
+def sheet_time(seconds_ago):
+    return time.strftime(leadindex.SENT_FORMAT, time.localtime(time.time() - seconds_ago))
+
+def data_row(name, phone, email, sent=""):
+    row = [""] * len(googlesheet.HEADERS)
+    row[0], row[8], row[9], row[12] = name, phone, email, sent
+    return row
+
+def save(**fields):
+    googlesheet.write_session(dict(LEAD, **fields))
+
+def test_new_lead_is_appended_and_emailed(campaign_sheet):
+    save(phone="0123456789", email="ali@example.com")
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.rows[1][9] == "ali@example.com"
+    assert campaign_sheet.rows[1][13] == "2025-01"
+    assert campaign_sheet.sent == ["ali@example.com"]
+
+def test_repeat_within_window_updates_row_without_resend(campaign_sheet):
+    campaign_sheet.rows.append(data_row("Old", "0122222222", "Ali@Example.com", sheet_time(60)))
+    save(name="Ali", phone="60122222222", email="ali@example.com")
+
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.rows[1][0] == "Ali"
+    assert campaign_sheet.rows[1][12] == sheet_time(60)      # Email_sent kept
+    assert campaign_sheet.sent == []
+    assert "append_rows" not in campaign_sheet.calls
+
+def test_repeat_after_window_is_emailed_again(campaign_sheet):
+    campaign_sheet.rows.append(data_row("Old", "", "ali@example.com", sheet_time(2 * 86400)))
+    save(phone="0123456789", email="ali@example.com")
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.sent == ["ali@example.com"]
+
+def test_phone_match_keeps_the_earlier_lead(campaign_sheet):
+    campaign_sheet.rows.append(data_row("Old", "0133333333", "old@example.com", sheet_time(60)))
+    save(phone="+60 13-333 3333", email="new@example.com")
+    assert len(campaign_sheet.rows) == 3
+    assert campaign_sheet.rows[1][0] == "Old"
+    assert campaign_sheet.rows[1][9] == "old@example.com"
+    assert campaign_sheet.rows[2][9] == "new@example.com"
+    assert campaign_sheet.rows[2][12] == campaign_sheet.rows[1][12]   # the earlier send, for the poller
+    assert campaign_sheet.sent == []
+
+    # a third address on the same phone still finds that send
+    save(phone="0133333333", email="third@example.com")
+    assert len(campaign_sheet.rows) == 4
+    assert campaign_sheet.sent == []
+
+def test_phone_match_after_window_is_emailed(campaign_sheet):
+    campaign_sheet.rows.append(data_row("Old", "0133333333", "old@example.com", sheet_time(2 * 86400)))
+    save(phone="0133333333", email="new@example.com")
+    assert len(campaign_sheet.rows) == 3
+    assert campaign_sheet.sent == ["new@example.com"]
+
+def test_dedupe_can_be_switched_off(campaign_sheet, monkeypatch):
+    monkeypatch.setattr(googlesheet, "DEDUPE_LEADS", False)
+    save(phone="0123456789", email="ali@example.com")
+    save(phone="0123456789", email="ali@example.com")
+    assert len(campaign_sheet.rows) == 3
+    assert campaign_sheet.sent == ["ali@example.com", "ali@example.com"]
+
+def test_lead_saved_by_another_process_is_found(campaign_sheet):
+    # this process loaded its index before the other worker saved the lead
+    googlesheet.get_lead_index()
+    other = leadindex.LeadIndex(campaign_sheet.index_path)
+    campaign_sheet.rows.append(data_row("Ali", "0123456789", "ali@example.com", sheet_time(60)))
+    other.add(2, email="ali@example.com", phone="0123456789")
+    other.mark_sent(2)
+
+    save(phone="0123456789", email="ali@example.com")
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.sent == []
+
+def test_new_lead_costs_no_read(campaign_sheet):
+    googlesheet.get_lead_index()
+    campaign_sheet.calls.clear()
+    save(phone="0123456789", email="ali@example.com")
+    reads = {"row_values", "get", "batch_get"}
+    assert not reads & set(campaign_sheet.calls)
+
+def test_row_appended_outside_the_index_is_found_after_sync(campaign_sheet):
+    googlesheet.get_lead_index()
+    # e.g. added by hand, or an append whose response was lost
+    campaign_sheet.rows.append(data_row("Ali", "0123456789", "ali@example.com", sheet_time(60)))
+
+    googlesheet.sync_lead_index()     # what the background sync does
+    save(phone="0123456789", email="ali@example.com")
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.sent == []
+
+def test_deleted_row_is_not_overwritten(campaign_sheet):
+    save(name="Ali", phone="0123456789", email="ali@example.com")
+    save(name="Siti", phone="0198765432", email="siti@example.com")
+    del campaign_sheet.rows[1]        # Ali's row removed by hand; Siti moves up
+
+    save(name="Ali", phone="0123456789", email="ali@example.com")
+    names = [r[0] for r in campaign_sheet.rows[1:]]
+    assert names == ["Siti", "Ali"]
+    assert campaign_sheet.rows[1][9] == "siti@example.com"
+    # the index was rebuilt, so Siti's repeat finds her new row
+    save(name="Siti", phone="0198765432", email="siti@example.com")
+    assert [r[0] for r in campaign_sheet.rows[1:]] == ["Siti", "Ali"]
+
+def test_startup_resumes_instead_of_wiping(campaign_sheet):
+    first = leadindex.LeadIndex(campaign_sheet.index_path)
+    first.add(7, email="ali@example.com", session_id="lead-1")
+    first.mark_sent(7, when=123.0)
+
+    second = leadindex.LeadIndex(campaign_sheet.index_path)
+    googlesheet.sync_lead_index(second)
+    assert second.lookup_session("lead-1") == 7
+    assert first.lookup_email("ali@example.com") == 7
+    assert second.sent_at(7) == 123.0
+
+def test_index_reads_through_to_other_processes_rows(tmp_path):
+    path = str(tmp_path / "shared.db")
+    mine, theirs = leadindex.LeadIndex(path), leadindex.LeadIndex(path)
+    theirs.add(5, email="Ali@Example.com", phone="012-345 6789")
+    theirs.mark_sent(5, when=456.0)
+    assert mine.lookup_lead(phone="60123456789") == 5
+    assert mine.lookup_email("ali@example.com") == 5
+    assert mine.sent_at(5) == 456.0
+
+def test_lead_lock_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "shared.db")
+    mine, theirs = leadindex.LeadIndex(path), leadindex.LeadIndex(path)
+    order = []
+
+    def second():
+        with theirs.lead_lock(email="ALI@example.com"):
+            order.append("second")
+
+    with mine.lead_lock(email="ali@example.com", phone="0123456789"):
+        waiter = threading.Thread(target=second)
+        waiter.start()
+        time.sleep(0.3)
+        order.append("first")
+    waiter.join(5)
+    assert order == ["first", "second"]
+
+def test_abandoned_claim_is_taken_over(tmp_path, monkeypatch):
+    monkeypatch.setattr(leadindex, "CLAIM_TIMEOUT", 0.2)
+    path = str(tmp_path / "shared.db")
+    crashed, theirs = leadindex.LeadIndex(path), leadindex.LeadIndex(path)
+    crashed.lead_lock(email="ali@example.com").__enter__()    # never released
+
+    started = time.monotonic()
+    with theirs.lead_lock(email="ali@example.com"):
+        assert time.monotonic() - started < 5
@@ -0,0 +1,29 @@
+# test_lead_retry.py
+# A retried spool job (same lead id) rewrites the row its earlier attempt
+# appended instead of adding a second one, even with de-duplication off.
+
+import googlesheet
+
+LEAD = {"name": "Ali", "phone": "0123456789", "email": "ali@example.com"}
+
+def test_retry_rewrites_its_own_row(campaign_sheet, monkeypatch):
+    monkeypatch.setattr(googlesheet, "DEDUPE_LEADS", False)
+    googlesheet.write_session(dict(LEAD), lead_id="job-1")
+    googlesheet.write_session(dict(LEAD), lead_id="job-1")
+    assert len(campaign_sheet.rows) == 2
+    assert campaign_sheet.sent == ["ali@example.com"]
+
+def test_retry_after_row_was_replaced_appends(campaign_sheet, monkeypatch):
+    monkeypatch.setattr(googlesheet, "DEDUPE_LEADS", False)
+    googlesheet.write_session(dict(LEAD), lead_id="job-1")
+    campaign_sheet.rows[1][8:10] = ["0198765432", "siti@example.com"]   # edited by hand
+
+    googlesheet.write_session(dict(LEAD), lead_id="job-1")
+    assert len(campaign_sheet.rows) == 3
+    assert campaign_sheet.rows[1][9] == "siti@example.com"
+
+def test_other_leads_are_not_matched_by_session(campaign_sheet, monkeypatch):
+    monkeypatch.setattr(googlesheet, "DEDUPE_LEADS", False)
+    googlesheet.write_session(dict(LEAD), lead_id="job-1")
+    googlesheet.write_session(dict(LEAD), lead_id="job-2")
+    assert len(campaign_sheet.rows) == 3
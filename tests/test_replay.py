@@ -0,0 +1,78 @@
+# test_replay.py
+# A resent msg_id gets the cached reply without running the step again, so a
+# double submit or a retry after a timeout saves the lead only once.
+
+import threading
+import uuid
+
+import pytest
+
+import googlesheet
+import SatuGajiSatuHarapan
+
+SCRIPT = ["", "Ali", "25/12/1990", "1", "2", "3", "4", "0123456789", "RM 50,000", "a@b.com", "1"]
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(SatuGajiSatuHarapan, "start_background", lambda: None)
+    return SatuGajiSatuHarapan.create_app().test_client()
+
+@pytest.fixture
+def saved(monkeypatch):
+    calls = []
+    monkeypatch.setattr(googlesheet, "save_session", calls.append)
+    return calls
+
+def send(client, tab, message, msg_id=None):
+    body = {"message": message, "tab_id": tab}
+    if msg_id is not None:
+        body["msg_id"] = msg_id
+    response = client.post("/chat", json=body)
+    assert response.status_code == 200
+    return response.get_json()["reply"]
+
+def test_resent_messages_get_the_same_reply_and_save_once(client, saved):
+    tab = uuid.uuid4().hex
+    for n, message in enumerate(SCRIPT):
+        first = send(client, tab, message, msg_id=f"m{n}")
+        assert send(client, tab, message, msg_id=f"m{n}") == first
+    assert len(saved) == 1
+    assert saved[0]["email"] == "a@b.com"
+
+    replay = client.get("/metrics").get_json()["chat_replay"]
+    assert replay["replayed"] >= len(SCRIPT)
+    assert replay["suppression_rate"] > 0
+
+def test_concurrent_duplicates_run_the_step_once(client, saved):
+    tab = uuid.uuid4().hex
+    for n, message in enumerate(SCRIPT[:-2]):
+        send(client, tab, message, msg_id=f"m{n}")
+
+    # the same email submission, twice at once
+    replies = []
+    def submit():
+        replies.append(send(client, tab, "a@b.com", msg_id="email"))
+    threads = [threading.Thread(target=submit) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(saved) == 1
+    assert replies[0] == replies[1]
+
+def test_messages_without_msg_id_are_always_processed(client, saved):
+    tab = uuid.uuid4().hex
+    send(client, tab, "")
+    assert send(client, tab, "Ali").startswith("Hello, Ali!")
+    # a second "Ali" is read as the date of birth
+    assert not send(client, tab, "Ali").startswith("Hello, Ali!")
+
+def test_reset_forgets_the_last_reply(client, saved):
+    tab = uuid.uuid4().hex
+    send(client, tab, "", msg_id="m0")
+    greeting = send(client, tab, "Ali", msg_id="m1")
+    client.post("/reset", json={"tab_id": tab})
+
+    # after a reset, m1 is a new message on a fresh chatbot, not a replay
+    assert send(client, tab, "Ali", msg_id="m1") != greeting
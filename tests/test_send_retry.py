@@ -0,0 +1,40 @@
+# test_send_retry.py
+# send_email retries once when the connection drops before the message is
+# complete, and never once the final "." has gone out (the server may
+# already have accepted it).
+
+import pytest
+
+import Emailservice
+from smtppool import SMTPPool
+
+@pytest.fixture
+def pool(smtp_sink, monkeypatch, tmp_path):
+    pool = SMTPPool("127.0.0.1", smtp_sink.port, starttls=False, size=2, timeout=5)
+    monkeypatch.setattr(Emailservice, "get_smtp_pool", lambda: pool)
+    monkeypatch.setattr(Emailservice, "_daily_budget", None)
+    monkeypatch.setattr(Emailservice, "EMAIL_QUOTA_PATH", str(tmp_path / "email_quota.db"))
+    yield pool
+    pool.close()
+
+def send(to="ali@example.com"):
+    Emailservice.send_email(to, "Subject", "<p>hi</p>", attachment_path="missing.pdf")
+
+def test_drop_during_data_is_retried(pool, smtp_sink):
+    smtp_sink.drop_in_data = 1
+    send()
+    assert len(smtp_sink.messages) == 1
+    assert smtp_sink.connections == 2
+
+def test_421_before_data_is_retried(pool, smtp_sink):
+    smtp_sink.reply_421_to_mail = 1
+    send()
+    assert len(smtp_sink.messages) == 1
+
+def test_lost_reply_after_terminator_is_not_resent(pool, smtp_sink):
+    smtp_sink.drop_after_data = 1
+    send()                          # counted as sent, no exception
+    assert len(smtp_sink.messages) == 1
+    assert smtp_sink.commands.count("DATA") == 1
+    send("next@example.com")        # the pool recovers on a fresh connection
+    assert len(smtp_sink.messages) == 2
@@ -0,0 +1,98 @@
+# test_sheetsquota.py
+# Which Sheets errors are retried: reads on any transient failure, writes
+# only when the server cannot have applied them.
+
+import json
+
+import pytest
+import requests
+import urllib3
+from gspread.exceptions import APIError
+
+import sheetsquota
+from sheetsquota import SheetsScheduler, is_retryable, never_sent
+
+def api_error(status):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({"error": {"code": status, "message": "x"}}).encode()
+    return APIError(response)
+
+def wrapped(reason):
+    # what requests raises once urllib3 gives up on a connection
+    return requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(None, "https://sheets.googleapis.com", reason)
+    )
+
+REFUSED = wrapped(urllib3.exceptions.NewConnectionError(None, "refused"))
+RESET = wrapped(urllib3.exceptions.ProtocolError("reset", ConnectionResetError()))
+
+@pytest.mark.parametrize("error", [
+    ConnectionRefusedError(),
+    requests.exceptions.ConnectTimeout(),
+    REFUSED,
+])
+def test_never_sent(error):
+    assert never_sent(error)
+    assert is_retryable(error, "write")
+    assert is_retryable(error, "read")
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ReadTimeout(),
+    RESET,
+    ConnectionResetError(),
+    requests.exceptions.ConnectionError("no reason attached"),
+])
+def test_lost_after_sending_is_retried_for_reads_only(error):
+    assert not never_sent(error)
+    assert not is_retryable(error, "write")
+    assert is_retryable(error, "read")
+
+@pytest.mark.parametrize("status, read, write", [
+    (429, True, True),
+    (500, True, False),
+    (503, True, False),
+    (400, False, False),
+    (403, False, False),
+])
+def test_api_errors(status, read, write):
+    error = api_error(status)
+    assert is_retryable(error, "read") is read
+    assert is_retryable(error, "write") is write
+
+def test_other_errors_are_not_retried():
+    assert not is_retryable(ValueError(), "read")
+    assert not is_retryable(ValueError(), "write")
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheetsquota.time, "sleep", lambda _: None)
+    return SheetsScheduler(600000, 600000, 10000, str(tmp_path / "quota.db"))
+
+def failing(*errors):
+    calls = []
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+    return fn, calls
+
+def test_write_that_may_have_landed_is_not_repeated(scheduler):
+    fn, calls = failing(requests.exceptions.ReadTimeout())
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        scheduler.call("write", fn)
+    assert len(calls) == 1
+    assert scheduler.stats["failed"] == 1
+
+def test_write_retried_on_429_and_refused_connection(scheduler):
+    fn, calls = failing(api_error(429), REFUSED)
+    assert scheduler.call("write", fn) == "ok"
+    assert len(calls) == 3
+    assert scheduler.stats["retries"] == 2
+    assert scheduler.stats["throttled"] == 1
+
+def test_read_retried_on_timeout_and_5xx(scheduler):
+    fn, calls = failing(requests.exceptions.ReadTimeout(), api_error(503))
+    assert scheduler.call("read", fn) == "ok"
+    assert len(calls) == 3
@@ -0,0 +1,52 @@
+# test_sheetwriter.py
+# Every caller's Future resolves to the row its own row landed on, across
+# batches and concurrent callers.
+
+import threading
+
+import pytest
+
+from conftest import FakeWorksheet
+from sheetwriter import SheetWriter, first_row_of
+
+def test_first_row_of():
+    assert first_row_of({"updates": {"updatedRange": "Campaign1!A10:N12"}}) == 10
+    assert first_row_of({"updates": {"updatedRange": "'Campaign 1'!A2"}}) == 2
+    with pytest.raises(ValueError):
+        first_row_of({"updates": {"updatedRange": "Campaign1"}})
+
+def test_concurrent_appends_get_their_own_row_numbers():
+    ws = FakeWorksheet([["Name"]])
+    writer = SheetWriter(lambda: ws, max_rows=7, max_delay_ms=20)
+    futures = {}
+    lock = threading.Lock()
+
+    def caller(n):
+        for i in range(10):
+            name = f"lead-{n}-{i}"
+            future = writer.append([name])
+            with lock:
+                futures[name] = future
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    rows = {name: future.result(timeout=5) for name, future in futures.items()}
+    assert sorted(rows.values()) == list(range(2, 82))
+    for name, row in rows.items():
+        assert ws.rows[row - 1] == [name]
+    assert ws.calls.count("append_rows") > 1
+
+def test_failed_append_fails_every_future_in_the_batch():
+    class Broken:
+        def append_rows(self, rows, **kwargs):
+            raise ConnectionError("boom")
+
+    writer = SheetWriter(lambda: Broken(), max_rows=2, max_delay_ms=1000)
+    futures = [writer.append(["a"]), writer.append(["b"])]
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result(timeout=5)
@@ -0,0 +1,100 @@
+# test_smtppool.py
+# SMTPPool against the local sink: connection reuse, replacement after a
+# drop, retirement after max_messages, and dot-stuffing of streamed DATA.
+
+import smtplib
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from smtppool import SMTPPool
+
+@pytest.fixture
+def make_pool(smtp_sink):
+    pools = []
+    def make(**kwargs):
+        kwargs.setdefault("timeout", 5)
+        pool = SMTPPool("127.0.0.1", smtp_sink.port, starttls=False, **kwargs)
+        pools.append(pool)
+        return pool
+    yield make
+    for pool in pools:
+        pool.close()
+
+def send(pool, body=b"hello\r\n"):
+    return pool.send_stream("me@example.com", ["ali@example.com"], [body])
+
+def unstuff(data):
+    lines = data.split(b"\r\n")
+    return b"\r\n".join(line[1:] if line[:2] == b".." else line for line in lines)
+
+def test_connection_is_reused(make_pool, smtp_sink):
+    pool = make_pool()
+    for _ in range(3):
+        assert send(pool)[0] == 250
+    assert smtp_sink.connections == 1
+    assert len(smtp_sink.messages) == 3
+
+def test_dropped_connection_is_replaced(make_pool, smtp_sink):
+    pool = make_pool(size=1)
+    send(pool)
+    smtp_sink.drop_in_data = 1
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        send(pool, b"line\r\n" * 20000)     # large enough to hit the closed socket
+    send(pool)                              # size=1: the slot was given back
+    assert smtp_sink.connections == 2
+    assert len(smtp_sink.messages) == 2
+
+def test_stale_idle_connection_is_replaced(make_pool, smtp_sink):
+    pool = make_pool(size=1, idle_check=0)
+    send(pool)
+    pool._idle[0].smtp.sock.shutdown(socket.SHUT_RDWR)  # as if the server timed it out
+    send(pool)
+    assert smtp_sink.connections == 2
+
+def test_connection_retired_after_max_messages(make_pool, smtp_sink):
+    pool = make_pool(max_messages=2)
+    for _ in range(5):
+        send(pool)
+    assert smtp_sink.connections == 3
+    assert len(smtp_sink.messages) == 5
+
+def test_prime_opens_connections_ahead(make_pool, smtp_sink):
+    pool = make_pool(size=2)
+    assert pool.prime(5) == 2
+    send(pool)
+    assert smtp_sink.connections == 2
+
+@pytest.mark.parametrize("chunks", [
+    [b".starts the message\r\n"],
+    [b"a\r\n.b\r\n..c\r\n"],
+    [b"a\r\n", b".b\r\n"],                  # dot at the start of a chunk
+    [b"x\r", b"\n.y\r\n"],                  # CRLF split across chunks
+    [b"x\r\n", b"", b".", b"y\r\n"],        # empty chunk, lone dot
+    [b"no dot.\r\n", b"mid.line\r\n"],
+])
+def test_stream_data_dot_stuffs_across_chunks(make_pool, smtp_sink, chunks):
+    send_chunks = make_pool().send_stream
+    send_chunks("me@example.com", ["ali@example.com"], chunks)
+    (data,) = smtp_sink.messages
+    assert not any(line == b".\r\n" for line in data.splitlines(keepends=True))
+    assert unstuff(data) == b"".join(chunks)
+
+def test_unterminated_last_line_gets_crlf(make_pool, smtp_sink):
+    make_pool().send_stream("me@example.com", ["ali@example.com"], [b"a\r\n", b".b"])
+    assert smtp_sink.messages == [b"a\r\n..b\r\n"]
+
+def test_send_message_strips_bcc(make_pool, smtp_sink):
+    msg = EmailMessage()
+    msg["From"] = "me@example.com"
+    msg["To"] = "ali@example.com"
+    msg["Bcc"] = "boss@example.com"
+    msg["Subject"] = "hi"
+    msg.set_content(".leading dot\n")
+    make_pool().send_message(msg)
+    (data,) = smtp_sink.messages
+    assert b"Bcc" not in data
+    assert b"\r\n..leading dot\r\n" in data
+    assert smtp_sink.commands.count("RCPT") == 2
+    assert msg["Bcc"] == "boss@example.com"     # the caller's message is untouched
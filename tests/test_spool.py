@@ -0,0 +1,72 @@
+# test_spool.py
+# Leases: a running job is renewed while its handler runs, and only the
+# worker holding the current lease can complete or fail it.
+
+import sqlite3
+import threading
+import time
+
+import spool
+from spool import LeadSpool
+
+def test_stale_worker_cannot_complete_a_reclaimed_job(tmp_path):
+    queue = LeadSpool(str(tmp_path / "spool.db"))
+    job_id = queue.enqueue({"n": 1})
+    _, _, first = queue.claim()
+    queue._conn().execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+    _, _, second = queue.claim()
+
+    assert not queue.complete(job_id, first)
+    assert not queue.fail(job_id, first, "late")
+    assert not queue.renew(job_id, first)
+    assert queue.pending_count() == 1
+    assert queue.complete(job_id, second)
+    assert queue.pending_count() == 0
+
+def test_renewed_lease_is_not_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool, "LEASE_SECONDS", 0.2)
+    queue = LeadSpool(str(tmp_path / "spool.db"))
+    job_id = queue.enqueue({"n": 1})
+    _, _, token = queue.claim()
+    time.sleep(0.1)
+    assert queue.renew(job_id, token)
+    time.sleep(0.15)
+    assert queue.claim() is None
+
+def test_slow_job_runs_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool, "LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(spool, "RENEW_INTERVAL", 0.1)
+    monkeypatch.setattr(spool, "POLL_INTERVAL", 0.05)
+    queue = LeadSpool(str(tmp_path / "spool.db"))
+    runs = []
+
+    def handler(payload):
+        runs.append(payload)
+        time.sleep(1.0)         # well past the lease
+
+    queue.enqueue({"n": 1})
+    for _ in range(2):
+        threading.Thread(target=spool._worker_loop, args=(queue, handler), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while queue.pending_count() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert runs == [{"n": 1}]
+    assert queue.pending_count() == 0
+
+def test_old_spool_file_gains_lease_token(tmp_path):
+    path = str(tmp_path / "spool.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL,"
+        " status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0,"
+        " not_before REAL NOT NULL DEFAULT 0, lease_until REAL NOT NULL DEFAULT 0,"
+        " created REAL NOT NULL, last_error TEXT)"
+    )
+    conn.execute("INSERT INTO jobs (payload, created) VALUES ('{}', 0)")
+    conn.commit()
+    conn.close()
+
+    queue = LeadSpool(path)
+    job_id, payload, token = queue.claim()
+    assert payload == {}
+    assert queue.complete(job_id, token)
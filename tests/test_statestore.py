@@ -0,0 +1,98 @@
+# test_statestore.py
+# The three state stores: idle TTL, LRU cap, sliding expiry, and the
+# Redis store against fakeredis as a local stand-in.
+
+import time
+
+import fakeredis
+import pytest
+
+import chatstate
+from statestore import (
+    MemoryStateStore, RedisStateStore, SQLiteStateStore, create_state_store,
+)
+
+STATE = chatstate.pack("start", {"name": "Ali"})
+
+def test_memory_store_expires_idle_tabs():
+    store = MemoryStateStore(ttl=0.1)
+    store.set("a", STATE)
+    assert store.get("a") == STATE
+    time.sleep(0.15)
+    assert store.get("a") is None
+    assert len(store) == 0
+
+def test_memory_store_ttl_slides_on_access():
+    store = MemoryStateStore(ttl=0.2)
+    store.set("a", STATE)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert store.get("a") == STATE
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStateStore(max_entries=2)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")                  # b is now the oldest
+    store.set("c", 3)
+    assert store.get("b") is None
+    assert (store.get("a"), store.get("c")) == (1, 3)
+    assert len(store) == 2
+
+def test_sqlite_store_round_trip_and_expiry(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "states.db"), ttl=0.1)
+    store.set("a", STATE)
+    store.set("b", ["m1", "reply"])
+    assert store.get("a") == list(STATE)        # JSON has no tuples
+    assert store.get("b") == ["m1", "reply"]
+    store.delete("b")
+    assert store.get("b") is None
+    time.sleep(0.15)
+    assert store.get("a") is None
+    assert store.purge() == 1
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "states.db")
+    SQLiteStateStore(path).set("a", STATE)
+    assert SQLiteStateStore(path).get("a") == list(STATE)
+
+def test_sqlite_store_purges_every_n_writes(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "states.db"), ttl=0.05, purge_every=3)
+    store.set("old", 1)
+    time.sleep(0.1)
+    store.set("b", 2)
+    store.set("c", 3)               # third write purges "old"
+    (count,) = store._conn().execute("SELECT COUNT(*) FROM states").fetchone()
+    assert count == 2
+
+@pytest.fixture
+def redis_store():
+    return RedisStateStore(client=fakeredis.FakeRedis(), ttl=60)
+
+def test_redis_store_round_trip(redis_store):
+    text = chatstate.pack_text("start", {"name": "Ali"})
+    redis_store.set("a", text)
+    redis_store.set("b", ["m1", "reply"])
+    assert redis_store.get("a") == text
+    assert redis_store.get("b") == ["m1", "reply"]
+    assert redis_store.client.get("sgsh:state:a") == text.encode()
+    redis_store.delete("a")
+    assert redis_store.get("a") is None
+
+def test_redis_store_uses_native_expiry(redis_store):
+    redis_store.set("a", STATE)
+    client = redis_store.client
+    assert 0 < client.ttl("sgsh:state:a") <= 60
+    client.expire("sgsh:state:a", 5)
+    redis_store.get("a")            # reading slides the TTL back up
+    assert client.ttl("sgsh:state:a") > 5
+
+def test_factory():
+    assert isinstance(create_state_store("memory", ttl=5), MemoryStateStore)
+    with pytest.raises(ValueError):
+        create_state_store("postgres://nowhere")
+
+def test_factory_sqlite_path(tmp_path):
+    store = create_state_store(f"sqlite:///{tmp_path}/states.db")
+    assert isinstance(store, SQLiteStateStore)
+    assert store.path == f"{tmp_path}/states.db"
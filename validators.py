@@ -0,0 +1,149 @@
+# validators.py
+# Input parsing and validation for the chatbot and for imported leads
+# Patterns are compiled once; inputs longer than the caps below are
+# rejected before any regex work.
+
+import re
+import time
+from datetime import datetime, timedelta
+
+# -----------------------------
+# Input length caps
+# -----------------------------
+MAX_DOB_LENGTH = 32
+MAX_EMAIL_LENGTH = 254      # RFC 5321 path limit
+MAX_PHONE_LENGTH = 32
+MAX_INCOME_LENGTH = 32
+
+_NON_DIGIT_RE = re.compile(r"[^\d]")
+
+# -----------------------------
+# Date of birth
+# -----------------------------
+# DD/MM/YYYY with "/", "-" or "." (used consistently) and optional spaces,
+# e.g. "25/12/1990", "25 / 12 / 1990", "25-12-1990", "5.1.1990"
+_DOB_RE = re.compile(r"\s*(\d{1,2})\s*([/.\-])\s*(\d{1,2})\s*\2\s*(\d{4})\s*")
+
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def parse_dob(text):
+    """Return (year, month, day) for a DD/MM/YYYY string, or None if invalid."""
+    if len(text) > MAX_DOB_LENGTH:
+        return None
+    m = _DOB_RE.fullmatch(text)
+    if m is None:
+        return None
+    day, month, year = int(m.group(1)), int(m.group(3)), int(m.group(4))
+    if not 1 <= month <= 12 or day < 1 or year < 1:
+        return None
+    if day > _DAYS_IN_MONTH[month] and not (month == 2 and day == 29 and _is_leap(year)):
+        return None
+    return year, month, day
+
+# -----------------------------
+# Today, cached until the next local midnight
+# -----------------------------
+_today = None
+_today_expires = 0.0
+
+def today():
+    """(year, month, day) of the local date; recomputed once per day."""
+    global _today, _today_expires
+    if time.time() >= _today_expires:
+        now = datetime.now()
+        midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        _today = (now.year, now.month, now.day)
+        _today_expires = midnight.timestamp()
+    return _today
+
+def calculate_age(dob_str):
+    """Age in whole years for a DD/MM/YYYY string, or None if it is not a valid date."""
+    dob = parse_dob(dob_str)
+    if dob is None:
+        return None
+    year, month, day = today()
+    return year - dob[0] - ((month, day) < (dob[1], dob[2]))
+
+# -----------------------------
+# Income
+# -----------------------------
+def parse_income(message):
+    """'RM 30,000' -> 30000. Every non-digit is dropped; None if no digits remain."""
+    if len(message) > MAX_INCOME_LENGTH:
+        return None
+    cleaned = _NON_DIGIT_RE.sub("", message)
+    return int(cleaned) if cleaned else None
+
+# -----------------------------
+# Email
+# -----------------------------
+_EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+
+def validate_email(email):
+    if len(email) > MAX_EMAIL_LENGTH:
+        return False
+    return _EMAIL_RE.fullmatch(email) is not None
+
+def normalise_email(email):
+    """Trimmed, lower-cased address, or None if it is not valid."""
+    email = str(email).strip()
+    if not validate_email(email):
+        return None
+    return email.lower()
+
+# -----------------------------
+# Malaysian phone numbers
+# -----------------------------
+# Valid formats once non-digits are removed: 60 (country code) + 8-9 digits,
+# or a local number 01 + 7-8 digits
+_PHONE_RE = re.compile(r"60\d{8,9}|01\d{7,8}")
+
+def normalise_phone(phone):
+    """Canonical 60XXXXXXXXX form of a Malaysian number, or None if invalid."""
+    phone = str(phone)
+    if len(phone) > MAX_PHONE_LENGTH:
+        return None
+    digits = _NON_DIGIT_RE.sub("", phone)
+    if _PHONE_RE.fullmatch(digits) is None:
+        return None
+    return "6" + digits if digits[0] == "0" else digits
+
+def validate_malaysian_phone(phone):
+    return normalise_phone(phone) is not None
+
+# -----------------------------
+# Bulk API (back-office cleanup of imported leads)
+# -----------------------------
+def normalise_emails(values):
+    """Normalise a whole column; invalid entries become None."""
+    return [normalise_email(v) for v in values]
+
+def normalise_phones(values):
+    return [normalise_phone(v) for v in values]
+
+def parse_incomes(values):
+    return [parse_income(str(v)) for v in values]
+
+def clean_records(records, email_key="Email", phone_key="Phone"):
+    """
+    Validate rows from `worksheet.get_all_records()` in one pass.
+    Returns (cleaned, problems):
+      cleaned  : list of (row_number, email, phone) with canonical values
+                 (None where the cell is invalid)
+      problems : list of (row_number, column, raw_value) for invalid non-empty cells
+    """
+    cleaned, problems = [], []
+    for row_number, record in enumerate(records, start=2):  # Row 2 = first data row
+        raw_email = str(record.get(email_key, "") or "").strip()
+        raw_phone = str(record.get(phone_key, "") or "").strip()
+        email = normalise_email(raw_email) if raw_email else None
+        phone = normalise_phone(raw_phone) if raw_phone else None
+        if raw_email and email is None:
+            problems.append((row_number, email_key, raw_email))
+        if raw_phone and phone is None:
+            problems.append((row_number, phone_key, raw_phone))
+        cleaned.append((row_number, email, phone))
+    return cleaned, problems
@@ -0,0 +1,141 @@
+# warmup.py
+# Startup warm-up so the first lead after a worker starts is not the one
+# paying for OAuth token minting, the spreadsheet lookup, DNS/TLS to Google
+# and smtp.gmail.com, and encoding Benefits.pdf.
+# Runs in a background thread. /readyz reports ready once every step has had
+# one attempt (or after SGSH_WARMUP_TIMEOUT seconds): /chat only needs the
+# state store, and the spool absorbs Sheets/SMTP outages. Steps that failed
+# are reported as degraded and keep retrying in the background.
+
+import os
+import threading
+import time
+
+# -----------------------------
+# Config
+# -----------------------------
+WARMUP_ENABLED = os.environ.get("SGSH_WARMUP", "1") != "0"
+SMTP_PREWARM = int(os.environ.get("SGSH_SMTP_PREWARM", 1))   # connections opened ahead
+ATTACHMENT_PATH = "Benefits.pdf"
+FIRST_PASS_TIMEOUT = float(os.environ.get("SGSH_WARMUP_TIMEOUT", 60))   # seconds
+RETRY_DELAY = 2             # seconds, doubled per failed attempt
+MAX_RETRY_DELAY = 60
+
+# -----------------------------
+# Steps (heavy modules imported locally, inside the warm-up thread)
+# -----------------------------
+def load_attachment():
+    from attachments import get_attachment
+    if get_attachment(ATTACHMENT_PATH) is None:
+        # emails go out without it (as before warm-up existed); it is picked
+        # up on the first send after the file appears
+        print(f"[Warning] Attachment not found: {ATTACHMENT_PATH}")
+        return "missing"
+
+def mint_token():
+    from googleclient import refresh_token
+    refresh_token()
+
+def open_worksheet():
+    from googlesheet import get_header_map, get_sheet
+    get_header_map(get_sheet())
+
+def load_lead_index():
+    from googlesheet import get_lead_index
+    get_lead_index()
+
+def prime_smtp():
+    from Emailservice import get_smtp_pool
+    get_smtp_pool().prime(SMTP_PREWARM)
+
+STEPS = [
+    ("attachment", load_attachment),
+    ("token", mint_token),
+    ("worksheet", open_worksheet),
+    ("lead_index", load_lead_index),
+    ("smtp", prime_smtp),
+]
+
+class WarmUp:
+
+    def __init__(self, steps=STEPS, enabled=WARMUP_ENABLED):
+        self.steps = list(steps)
+        self.enabled = enabled
+        self.status = {name: "pending" if enabled else "skipped" for name, _ in self.steps}
+        self.ready = threading.Event()
+        self.started = None
+        self.finished = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if not enabled:
+            self.ready.set()
+
+    def _attempt(self, name, step):
+        """Run `step` once. Returns False if it raised."""
+        self.status[name] = "running"
+        t0 = time.monotonic()
+        try:
+            result = step()
+        except Exception as e:
+            self.status[name] = f"error: {e}"
+            return False
+        self.status[name] = result or "ok"
+        print(f"[Warmup] {name} {self.status[name]} in {(time.monotonic() - t0) * 1000:.0f} ms")
+        return True
+
+    def _retry(self, name, step):
+        delay = RETRY_DELAY
+        while True:
+            print(f"[Warmup] {name} failed, retrying in {delay}s: {self.status[name]}")
+            time.sleep(delay)
+            if self._attempt(name, step):
+                return
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def run(self):
+        self.started = time.monotonic()
+        failed = [(name, step) for name, step in self.steps if not self._attempt(name, step)]
+        # keep the token fresh from now on instead of refreshing inline on a
+        # request; the refresher retries on its own if the token step failed
+        from googleclient import start_token_refresher
+        start_token_refresher()
+        self.finished = time.monotonic()
+        self.ready.set()
+        state = f"degraded ({', '.join(name for name, _ in failed)})" if failed else "done"
+        print(f"[Warmup] First pass {state} in {self.finished - self.started:.1f}s")
+        for name, step in failed:
+            self._retry(name, step)
+
+    def start(self, timeout=FIRST_PASS_TIMEOUT):
+        """
+        Run the steps in a daemon thread (once). No-op when disabled. Ready is
+        set after the first pass, or after `timeout` if a step hangs.
+        """
+        with self._lock:
+            if self.enabled and self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+                self._thread.start()
+                timer = threading.Timer(timeout, self.ready.set)
+                timer.daemon = True
+                timer.start()
+
+    def degraded(self):
+        return any(status not in ("ok", "skipped") for status in self.status.values())
+
+    def report(self):
+        report = {"ready": self.ready.is_set(), "degraded": self.degraded(),
+                  "steps": dict(self.status)}
+        if self.finished is not None:
+            report["seconds"] = round(self.finished - self.started, 3)
+        return report
+
+_warmup = WarmUp()
+
+def start():
+    _warmup.start()
+
+def is_ready():
+    return _warmup.ready.is_set()
+
+def report():
+    return _warmup.report()
@@ -0,0 +1,47 @@
+# watermark.py
+# Named high-water marks (e.g. "last Campaign1 row scanned for pending emails")
+# persisted in a small SQLite file so pollers resume where they stopped
+# after a restart.
+
+import os
+import sqlite3
+import threading
+
+# -----------------------------
+# Config
+# -----------------------------
+WATERMARK_PATH = os.environ.get("SGSH_WATERMARK_PATH", "watermarks.db")
+
+class Watermark:
+    """One integer mark. Thread-safe; the file may be shared by several processes."""
+
+    def __init__(self, name, default=0, path=WATERMARK_PATH):
+        self.name = name
+        self.default = default
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS marks (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self):
+        found = self._conn().execute(
+            "SELECT value FROM marks WHERE name = ?", (self.name,)
+        ).fetchone()
+        return found[0] if found else self.default
+
+    def set(self, value):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO marks (name, value) VALUES (?, ?)", (self.name, value)
+        )
+
+    def reset(self):
+        self._conn().execute("DELETE FROM marks WHERE name = ?", (self.name,))
@@ -0,0 +1,20 @@
+# wsgi.py
+# WSGI entry point for production serving (instead of app.run(debug=True))
+#   gunicorn -c gunicorn.conf.py wsgi:app     multi-process + threads (Linux)
+#   python wsgi.py                            waitress, one process, threads
+# The app (and this process's spool workers and warm-up) is created here,
+# by SatuGajiSatuHarapan.create_app(), not when that module is imported.
+
+import os
+
+from SatuGajiSatuHarapan import create_app
+
+app = create_app()
+
+BIND = os.environ.get("SGSH_BIND", "0.0.0.0:8000")
+THREADS = int(os.environ.get("SGSH_THREADS", 8))
+
+if __name__ == "__main__":
+    from waitress import serve
+    host, _, port = BIND.rpartition(":")
+    serve(app, host=host, port=int(port), threads=THREADS)